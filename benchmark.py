@@ -0,0 +1,92 @@
+"""
+This script times the downsampling kernels of the pixelation core and prints
+the cost of every kernel per megapixel of source image, for pixel sizes that
+divide the image and for pixel sizes that leave a remainder to crop.
+
+Usage:
+    python3 benchmark.py
+    python3 benchmark.py images/Bruce.png --pixel-sizes 4 6 7 --repeat 5 > bench_output.txt
+"""
+
+import argparse
+import time
+import numpy as np
+from PIL import Image
+import pixelation
+
+
+def synthetic_image(width, height, seed=0):
+    """
+    Return an RGB test image: smooth gradients with noise, so that neither
+    the median nor the mode of a block is trivial.
+    """
+    rng = np.random.default_rng(seed)
+    ys, xs = np.mgrid[0:height, 0:width]
+    pixels = np.stack([xs * 255 // max(1, width - 1),
+                       ys * 255 // max(1, height - 1),
+                       (xs + ys) % 256], axis=-1)
+    pixels = pixels + rng.integers(-12, 13, pixels.shape)
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8), "RGB")
+
+
+def time_kernel(image, pixel_size, kernel, repeat=3):
+    """
+    Return the best time in seconds of downscaling the image with the kernel.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        pixelation.downscale(image, pixel_size, kernel)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(image, pixel_sizes, kernels=pixelation.KERNELS, repeat=3):
+    """
+    Time every kernel at every pixel size and return the report rows.
+    """
+    image.load()
+    megapixels = image.width * image.height / 1e6
+    rows = []
+    for pixel_size in pixel_sizes:
+        exact = image.width % pixel_size == 0 and image.height % pixel_size == 0
+        for kernel in kernels:
+            seconds = time_kernel(image, pixel_size, kernel, repeat)
+            rows.append({
+                "kernel": kernel,
+                "pixel_size": pixel_size,
+                "exact": exact,
+                "ms": seconds * 1000,
+                "ms_per_mp": seconds * 1000 / megapixels,
+            })
+    return rows
+
+
+def main(argv=None):
+    """
+    The command line entry point.
+    """
+    parser = argparse.ArgumentParser(description="Time the downsampling kernels.")
+    parser.add_argument("image", nargs="?",
+                        help="The image to downscale, by default a synthetic one")
+    parser.add_argument("--size", type=int, nargs=2, default=(4000, 3000),
+                        metavar=("WIDTH", "HEIGHT"),
+                        help="The size of the synthetic image")
+    parser.add_argument("-p", "--pixel-sizes", type=int, nargs="+", default=(4, 6, 7, 16))
+    parser.add_argument("-k", "--kernels", nargs="+", choices=pixelation.KERNELS,
+                        default=pixelation.KERNELS)
+    parser.add_argument("-r", "--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    image = Image.open(args.image) if args.image else synthetic_image(*args.size)
+    print(f"Image: {args.image or 'synthetic'} {image.width}x{image.height} "
+          f"{image.mode} ({image.width * image.height / 1e6:.1f} MP)")
+    print(f"{'kernel':<8} {'pixel size':>10} {'remainder':>10} {'ms':>9} {'ms/MP':>9}")
+    for row in run(image, args.pixel_sizes, args.kernels, args.repeat):
+        print(f"{row['kernel']:<8} {row['pixel_size']:>10} "
+              f"{'no' if row['exact'] else 'cropped':>10} "
+              f"{row['ms']:>9.1f} {row['ms_per_mp']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,21 +4,44 @@ for the image editor.
 """
 
 import sys
+import math
+from matplotlib.collections import LineCollection
 from PyQt5.QtWidgets import QWidget,QApplication, QVBoxLayout, QStyle
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, pyqtSignal
+from matplotlib.backend_bases import MouseButton
 from matplotlib.widgets import TextBox
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 import matplotlib.pyplot as plt
 import numpy as np
 from PIL import Image
 from pixel_editor import PixelEditor
+from pixel_canvas import PixelCanvas
 
 class BoardGUI(QWidget):
-    def __init__(self, image_editor):
+    # emitted after the cells or the palette may have changed
+    cells_changed = pyqtSignal()
+
+    def __init__(self, image_editor, fast_canvas=False):
         super().__init__()
         self.image_editor = image_editor
-        self.fig, self.ax = plt.subplots()
-        self.init_figure()
+        # the fast canvas paints the cells with QPainter instead of a Matplotlib figure
+        self.fast_canvas = fast_canvas
+        self.show_grid = False
+        # the tool used on click: "draw" paints one cell, "fill" is the bucket fill
+        self.tool = "draw"
+        self.fill_connectivity = 4
+        self.fill_tolerance = 0
+        self._grid_collection = None
+        self._grid_key = None
+        # the visible (xlim, ylim) of the Matplotlib board, None shows the whole image
+        self.view_limits = None
+        # the image of the Matplotlib board, updated in place by every redraw
+        self._image_artist = None
+        self._drag_start = None
+        self.fig, self.ax = None, None
+        if not fast_canvas:
+            self.fig, self.ax = plt.subplots()
+            self.init_figure()
         self.canvas = None
         self.init_canvas()
         self.layout = QVBoxLayout(self)
@@ -31,13 +54,26 @@ class BoardGUI(QWidget):
 
     def init_figure(self):
         self.fig.patch.set_visible(False)  # Make figure background invisible
+        # one figure pixel per image pixel, but never larger than the screen
+        width, height = self.image_editor.image.size
+        screen = QApplication.primaryScreen().availableGeometry()
+        fit = min(1, screen.width() * 0.8 / width, screen.height() * 0.8 / height)
         self.fig.set_size_inches(
-            (self.image_editor.image.width / 140, self.image_editor.image.height / 135))
+            (width * fit / self.fig.dpi, height * fit / self.fig.dpi))
         self.fig.subplots_adjust(left=0, right=1, top=1, bottom=0)
         self.fig.canvas.mpl_connect("button_press_event", self.on_click)
+        self.fig.canvas.mpl_connect("scroll_event", self.on_scroll)
+        self.fig.canvas.mpl_connect("motion_notify_event", self.on_motion)
+        self.fig.canvas.mpl_connect("button_release_event", self.on_release)
         self.ax.axis("off")
+        # the limits are the view, set by draw_view, not by the extent of the image
+        self.ax.set_autoscale_on(False)
 
     def init_canvas(self):
+        if self.fast_canvas:
+            self.canvas = PixelCanvas(self.image_editor, self)
+            self.canvas.cell_clicked.connect(self.paint_cell)
+            return
         self.canvas = FigureCanvas(self.fig)
         self.canvas.setStyleSheet("background-color:transparent;")  # Make canvas background transparent
         self.canvas.updateGeometry()
@@ -46,17 +82,170 @@ class BoardGUI(QWidget):
         """
         Display the image on the GUI. If update_only is True, only update the modified region.
         """
-        if update_only:
+        if self.fast_canvas:
+            self.canvas.refresh()
+            self.show()
+            self.cells_changed.emit()
+        elif update_only:
             # Logic to update only the modified region
             pass
         else:
             print("Displaying image")
-            self.ax.clear()  # Clear before displaying to avoid overlaying images
-            self.ax.axis("off")
-            self.ax.imshow(self.image_editor.image)
+            self.draw_view()
+            if self.show_grid:
+                grid = self.grid_collection()
+                if grid not in self.ax.collections:
+                    self.ax.add_collection(grid)
             self.canvas.draw()
             self.update()
             self.show()
+            self.cells_changed.emit()
+
+    def visible_cells(self):
+        """
+        Return the (first col, first row, last col, last row) range of the
+        cells in the view of the Matplotlib board.
+        """
+        rows, cols = self.image_editor.cells.shape
+        if not self.view_limits:
+            return 0, 0, cols, rows
+        pixel_size = self.image_editor.pixel_size
+        (left, right), (bottom, top) = self.view_limits
+        # imshow centers pixels on integers, so cell edges are at -0.5
+        return (max(0, math.floor((left + 0.5) / pixel_size)),
+                max(0, math.floor((top + 0.5) / pixel_size)),
+                min(cols, math.ceil((right + 0.5) / pixel_size)),
+                min(rows, math.ceil((bottom + 0.5) / pixel_size)))
+
+    def draw_view(self):
+        """
+        Show the cells in the view on the Matplotlib board, with the alpha of
+        their layers. Only the visible cells become pixels, and a zoomed out
+        view takes every factor-th cell, so the cost of a redraw depends on the
+        size of the canvas, not on the size of the image. The image is updated
+        in place, not shown again.
+        """
+        first_col, first_row, last_col, last_row = self.visible_cells()
+        canvas_width, canvas_height = self.canvas.get_width_height()
+        factor = max(1, min((last_col - first_col) // max(1, canvas_width),
+                            (last_row - first_row) // max(1, canvas_height)))
+        cells = self.image_editor.cells[first_row:last_row:factor,
+                                        first_col:last_col:factor]
+        pixels = np.array(self.image_editor.palette, dtype=np.uint8)[cells]
+        layers = self.image_editor.layers
+        if not layers.is_opaque():
+            # the alpha of the layers, as it is exported
+            pixels = np.dstack([pixels, layers.alpha[first_row:last_row:factor,
+                                                     first_col:last_col:factor]])
+        pixel_size = self.image_editor.pixel_size
+        rows, cols = cells.shape
+        extent = (first_col * pixel_size - 0.5,
+                  (first_col + cols * factor) * pixel_size - 0.5,
+                  (first_row + rows * factor) * pixel_size - 0.5,
+                  first_row * pixel_size - 0.5)
+        if self._image_artist is None:
+            self._image_artist = self.ax.imshow(pixels, extent=extent,
+                                                interpolation="nearest")
+        else:
+            self._image_artist.set_data(pixels)
+            self._image_artist.set_extent(extent)
+        if self.view_limits:
+            xlim, ylim = self.view_limits
+        else:
+            width, height = self.image_editor.image.size
+            xlim, ylim = (-0.5, width - 0.5), (height - 0.5, -0.5)
+        self.ax.set_xlim(xlim)
+        self.ax.set_ylim(ylim)
+
+    def set_view(self, left, top, view_width, view_height):
+        """
+        Show the given part of the image, in image coordinates, kept inside the image.
+        """
+        width, height = self.image_editor.image.size
+        left = min(max(left, -0.5), width - 0.5 - view_width)
+        top = min(max(top, -0.5), height - 0.5 - view_height)
+        self.view_limits = ((left, left + view_width), (top + view_height, top))
+        self.draw_view()
+        self.canvas.draw_idle()
+
+    def zoom(self, factor, center=None):
+        """
+        Zoom the view in (factor > 1) or out around center, in image coordinates.
+        """
+        if self.fast_canvas:
+            self.canvas.zoom_by(1 if factor > 1 else -1)
+            return
+        width, height = self.image_editor.image.size
+        xlim, ylim = self.ax.get_xlim(), self.ax.get_ylim()
+        if center is None:
+            center = (sum(xlim) / 2, sum(ylim) / 2)
+        view_width = min(width, abs(xlim[1] - xlim[0]) / factor)
+        view_height = min(height, abs(ylim[1] - ylim[0]) / factor)
+        if view_width >= width and view_height >= height:
+            self.zoom_fit()
+            return
+        self.set_view(center[0] - view_width / 2, center[1] - view_height / 2,
+                      view_width, view_height)
+
+    def pan_by(self, dx, dy):
+        """
+        Move the view of the Matplotlib board by the given number of screen
+        pixels (y up, as Matplotlib counts them).
+        """
+        if not self.view_limits:
+            # the whole image is shown
+            return
+        (left, right), (bottom, top) = self.view_limits
+        view_width, view_height = right - left, bottom - top
+        self.set_view(left - dx * view_width / self.ax.bbox.width,
+                      top + dy * view_height / self.ax.bbox.height,
+                      view_width, view_height)
+
+    def zoom_in(self, event=None):
+        """
+        Called when the zoom in button is clicked.
+        """
+        self.zoom(2)
+
+    def zoom_out(self, event=None):
+        """
+        Called when the zoom out button is clicked.
+        """
+        self.zoom(0.5)
+
+    def zoom_fit(self, event=None):
+        """
+        Show the whole image again.
+        """
+        if self.fast_canvas:
+            self.canvas.zoom_fit()
+            return
+        self.view_limits = None
+        self.draw_view()
+        self.canvas.draw_idle()
+
+    def on_scroll(self, event):
+        """
+        Called when the mouse wheel is used on the Matplotlib board.
+        """
+        if event.inaxes == self.ax:
+            self.zoom(2 if event.button == "up" else 0.5, (event.xdata, event.ydata))
+
+    def on_motion(self, event):
+        """
+        Called when the mouse moves on the Matplotlib board: drags the view.
+        """
+        if self._drag_start is not None:
+            dx, dy = event.x - self._drag_start[0], event.y - self._drag_start[1]
+            self._drag_start = (event.x, event.y)
+            self.pan_by(dx, dy)
+
+    def on_release(self, event):
+        """
+        Called when a mouse button is released on the Matplotlib board.
+        """
+        if event.button in (MouseButton.MIDDLE, MouseButton.RIGHT):
+            self._drag_start = None
 
     def reset_image(self, event):
         """
@@ -64,18 +253,40 @@ class BoardGUI(QWidget):
         """
         self.image_editor.reset_image()
 
+    def grid_collection(self):
+        """
+        Return the grid lines as a single line collection. It is built once per
+        (image size, pixel size) and reused by every redraw.
+        """
+        width, height = self.image_editor.image.size
+        pixel_size = self.image_editor.pixel_size
+        if self._grid_key != (width, height, pixel_size):
+            if self._grid_collection in self.ax.collections:
+                self._grid_collection.remove()
+            # imshow centers pixels on integers, so cell edges are at -0.5
+            xs = np.arange(0, width + 1, pixel_size) - 0.5
+            ys = np.arange(0, height + 1, pixel_size) - 0.5
+            segments = [((x, -0.5), (x, height - 0.5)) for x in xs] \
+                + [((-0.5, y), (width - 0.5, y)) for y in ys]
+            self._grid_collection = LineCollection(
+                segments, colors=[(0, 0, 0, 0.3)], linewidths=0.5)
+            self._grid_key = (width, height, pixel_size)
+        return self._grid_collection
+
     def turn_on_grid(self, event):
         """
-        Display the grid on the image.
+        Display the grid on the image, or hide it if it is already displayed.
         """
-        # check if the grid is already displayed - if so turn it off
-        if self.ax.xaxis.get_visible():
-            self.ax.xaxis.set_visible(False)
-            self.ax.yaxis.set_visible(False)
-        else:
-            self.ax.xaxis.set_visible(True)
-            self.ax.yaxis.set_visible(True)
-            self.change_pixel_size(self.image_editor.pixel_size)
+        self.show_grid = not self.show_grid
+        if self.fast_canvas:
+            self.canvas.set_grid_visible(self.show_grid)
+            return
+        # add or remove the overlay without drawing the image again
+        if self.show_grid:
+            self.ax.add_collection(self.grid_collection())
+        elif self._grid_collection in self.ax.collections:
+            self._grid_collection.remove()
+        self.canvas.draw_idle()
 
     def exit(self, event):
         """
@@ -115,7 +326,11 @@ class BoardGUI(QWidget):
         Called when the mouse is clicked on the image
         """
         print("Mouse clicked")
-        if event.inaxes == self.ax:
+        if event.button in (MouseButton.MIDDLE, MouseButton.RIGHT):
+            # drag with the right or middle button to pan
+            self._drag_start = (event.x, event.y)
+            return
+        if event.inaxes == self.ax and event.button == MouseButton.LEFT:
             x, y = int(event.xdata), int(event.ydata)
             x = min(
                 x // self.image_editor.pixel_size * self.image_editor.pixel_size,
@@ -125,10 +340,30 @@ class BoardGUI(QWidget):
                 y // self.image_editor.pixel_size * self.image_editor.pixel_size,
                 self.image_editor.image.height - self.image_editor.pixel_size,
             )
-            self.image_editor.paint_pixel(x, y)
+            if self.tool == "fill":
+                self.image_editor.flood_fill(
+                    x, y, self.fill_connectivity, self.fill_tolerance)
+            else:
+                self.image_editor.paint_pixel(x, y)
             self.canvas.draw()
             self.display_image()
 
+    def paint_cell(self, col, row):
+        """
+        Called when a cell of the fast canvas is clicked.
+        """
+        pixel_size = self.image_editor.pixel_size
+        if self.tool == "fill":
+            if self.image_editor.flood_fill(col * pixel_size, row * pixel_size,
+                                            self.fill_connectivity,
+                                            self.fill_tolerance):
+                self.canvas.refresh()
+                self.cells_changed.emit()
+            return
+        self.image_editor.paint_pixel(col * pixel_size, row * pixel_size)
+        self.canvas.refresh((col, row))
+        self.cells_changed.emit()
+
     def create_GIF(self, event):
         """
         Save the state of the GUI as an image at each step and create a GIF.
@@ -0,0 +1,86 @@
+"""
+This module contains the ColorUsage class, which counts how many cells of the
+logical grid use every palette index. The counts are built once per grid and
+then updated from the cells each edit changes, so questions like "which colors
+are unused" never rescan the image.
+"""
+
+import numpy as np
+
+PALETTE_SIZE = 256
+
+
+class ColorUsage:
+    """
+    Class to represent the per-palette-index cell counts of the image editor.
+    """
+
+    def __init__(self):
+        self.counts = np.zeros(PALETTE_SIZE, dtype=np.int64)
+        # palette indices and colors whose swatch is out of date in the toolbar
+        self.changed_indices = set()
+        self.changed_colors = set()
+
+    def rebuild(self, cells):
+        """
+        Count the cells of a whole new grid.
+        """
+        counts = np.bincount(cells.ravel(), minlength=PALETTE_SIZE)
+        self.changed_indices.update(np.flatnonzero(counts != self.counts).tolist())
+        self.counts = counts
+
+    def update(self, old, new):
+        """
+        Account for cells that changed from the old indices to the new ones.
+
+        :param old: The previous indices of the changed cells (any shape).
+        :param new: Their new index, or an array of indices shaped like old.
+        """
+        old = np.asarray(old, dtype=np.uint8).ravel()
+        if not old.size:
+            return
+        delta = -np.bincount(old, minlength=PALETTE_SIZE)
+        if np.isscalar(new) or np.ndim(new) == 0:
+            delta[int(new)] += old.size
+        else:
+            delta += np.bincount(np.asarray(new, dtype=np.uint8).ravel(),
+                                 minlength=PALETTE_SIZE)
+        self.counts += delta
+        self.changed_indices.update(np.flatnonzero(delta).tolist())
+
+    def mark_colors(self, *colors):
+        """
+        Mark colors whose swatch must be redrawn, for example after a recolor
+        that changed the palette but not the cells.
+        """
+        self.changed_colors.update(tuple(color[:3]) for color in colors)
+
+    def count(self, palette, color):
+        """
+        Return the number of cells shown with the color.
+        """
+        color = tuple(color[:3])
+        return int(sum(self.counts[index] for index, entry in enumerate(palette)
+                       if entry == color))
+
+    def used(self):
+        """
+        Return the palette indices used by at least one cell.
+        """
+        return np.flatnonzero(self.counts).tolist()
+
+    def unused(self, palette):
+        """
+        Return the palette indices no cell uses.
+        """
+        return np.flatnonzero(self.counts[:len(palette)] == 0).tolist()
+
+    def take_changed(self, palette):
+        """
+        Return the colors whose usage or look changed since the last call.
+        """
+        colors = self.changed_colors | {
+            palette[index] for index in self.changed_indices if index < len(palette)}
+        self.changed_indices = set()
+        self.changed_colors = set()
+        return colors
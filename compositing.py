@@ -0,0 +1,232 @@
+"""
+This module builds before/after comparison images out of several pictures.
+It replaces the old con.py (diagonal split) and concat.py (side by side)
+scripts with a reusable API and a command line tool.
+
+Batches are described by a manifest file with one JSON job per line, for example:
+
+    {"layout": "diagonal", "inputs": ["Bruce_crop.png", "result.png"], "output": "final_image.png", "angle": 35}
+    {"layout": "side_by_side", "inputs": ["bruce1.png", "bruce2.png"], "output": "bruce3.png", "crop_width": 0}
+    {"layout": "grid", "inputs": ["a.png", "b.png", "c.png", "d.png"], "output": "grid.png", "columns": 2}
+
+Relative paths are resolved against the directory of the manifest, and the whole
+manifest runs in a single process so the diagonal masks are computed only once
+per (shape, angle).
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+from functools import lru_cache
+import numpy as np
+from PIL import Image
+
+LAYOUTS = ("diagonal", "side_by_side", "grid")
+
+
+@lru_cache(maxsize=32)
+def create_mask_with_angle(shape, angle, flip=True):
+    """
+    Create a boolean mask with a diagonal at a certain angle.
+
+    The mask is built by broadcasting a column of row numbers against a row of
+    column numbers, so no full index planes are materialized. Masks are cached
+    per (shape, angle, flip) and returned read-only.
+
+    :param shape: The shape of the mask (height, width).
+    :param angle: The angle of the diagonal in degrees. An angle of 0 degrees will create a diagonal from the top-left to the bottom-right.
+    :param flip: Mirror the mask horizontally to change the direction of the diagonal.
+    :return: A boolean mask with the specified shape and diagonal angle.
+    """
+    height, width = shape
+    rows = np.arange(height)[:, np.newaxis]
+    cols = np.arange(width)
+    if flip:
+        cols = cols[::-1]
+    mask = rows >= math.tan(math.radians(angle)) * cols
+    mask.setflags(write=False)
+    return mask
+
+
+def _open_rgba(image):
+    """
+    Open an image path (or take a PIL image) and return it in RGBA mode.
+    """
+    if isinstance(image, Image.Image):
+        return image.convert("RGBA")
+    with Image.open(image) as opened:
+        return opened.convert("RGBA")
+
+
+def diagonal_split(first, second, angle=35, flip=True):
+    """
+    Split two images along a diagonal: the first image is shown on one side of
+    the diagonal and the second image on the other side.
+
+    :param first: Path or PIL image shown where the mask is set.
+    :param second: Path or PIL image shown elsewhere, resized to the first image.
+    :param angle: The angle of the diagonal in degrees.
+    :param flip: Mirror the diagonal horizontally.
+    :return: The composited RGBA image.
+    """
+    first = _open_rgba(first)
+    second = _open_rgba(second)
+    if second.size != first.size:
+        second = second.resize(first.size)
+    # the second image is the output buffer; the first one is copied into it in place
+    result = np.array(second)
+    mask = create_mask_with_angle(result.shape[:2], angle, flip)
+    np.copyto(result, np.asarray(first), where=mask[..., np.newaxis])
+    return Image.fromarray(result, "RGBA")
+
+
+def side_by_side(images, crop_width=0):
+    """
+    Place images next to each other, all resized to the size of the first one.
+
+    :param images: Paths or PIL images.
+    :param crop_width: The amount to crop from each side of every image.
+    :return: The composited RGBA image.
+    """
+    return grid(images, columns=len(images), crop_width=crop_width)
+
+
+def grid(images, columns=2, crop_width=0):
+    """
+    Arrange images in a grid with the given number of columns. Every cell has
+    the size of the first image; empty cells stay transparent.
+
+    :param images: Paths or PIL images.
+    :param columns: The number of images in each row.
+    :param crop_width: The amount to crop from each side of every image.
+    :return: The composited RGBA image.
+    """
+    if not images:
+        raise ValueError("At least one image is required")
+    columns = max(1, min(columns, len(images)))
+    rows = math.ceil(len(images) / columns)
+    cell_size = None
+    result = None
+    for position, image in enumerate(images):
+        image = _open_rgba(image)
+        if cell_size is None:
+            cell_size = image.size
+            cell_width = cell_size[0] - 2 * crop_width
+            cell_height = cell_size[1]
+            if cell_width <= 0:
+                raise ValueError("crop_width is larger than the image")
+            result = np.zeros(
+                (rows * cell_height, columns * cell_width, 4), dtype=np.uint8)
+        elif image.size != cell_size:
+            image = image.resize(cell_size)
+        top = position // columns * cell_height
+        left = position % columns * cell_width
+        # write each cell straight into its slice of the preallocated output
+        result[top:top + cell_height, left:left + cell_width] = np.asarray(
+            image)[:, crop_width:cell_size[0] - crop_width]
+    return Image.fromarray(result, "RGBA")
+
+
+def compose(job, base_dir="."):
+    """
+    Run a single compositing job and save its output.
+
+    :param job: A dictionary with the keys layout, inputs, output and the
+        optional angle, flip, columns and crop_width.
+    :param base_dir: The directory relative paths are resolved against.
+    :return: The path of the saved image.
+    """
+    layout = job.get("layout", "diagonal")
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown layout: {layout}")
+    inputs = [os.path.join(base_dir, path) for path in job["inputs"]]
+    output = os.path.join(base_dir, job["output"])
+    if layout == "diagonal":
+        if len(inputs) != 2:
+            raise ValueError("The diagonal layout needs exactly two inputs")
+        image = diagonal_split(inputs[0], inputs[1], job.get("angle", 35),
+                               job.get("flip", True))
+    elif layout == "side_by_side":
+        image = side_by_side(inputs, job.get("crop_width", 0))
+    else:
+        image = grid(inputs, job.get("columns", 2), job.get("crop_width", 0))
+    image.save(output)
+    return output
+
+
+def read_manifest(manifest_path):
+    """
+    Yield the jobs of a manifest file one at a time. Empty lines and lines
+    starting with # are skipped.
+    """
+    with open(manifest_path, encoding="utf-8") as manifest:
+        for line_number, line in enumerate(manifest, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as error:
+                raise ValueError(
+                    f"{manifest_path}:{line_number}: invalid job: {error}") from error
+
+
+def run_manifest(manifest_path):
+    """
+    Run every job of a manifest file in this process and return the saved paths.
+    """
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    outputs = []
+    for job in read_manifest(manifest_path):
+        outputs.append(compose(job, base_dir))
+        print(f"Saved {outputs[-1]}")
+    return outputs
+
+
+def main(argv=None):
+    """
+    The command line entry point.
+    """
+    parser = argparse.ArgumentParser(
+        description="Create comparison images from several pictures.")
+    parser.add_argument("inputs", nargs="*", help="The images to combine")
+    parser.add_argument("-o", "--output", default="final_image.png",
+                        help="The output image path")
+    parser.add_argument("-l", "--layout", choices=LAYOUTS, default="diagonal")
+    parser.add_argument("-a", "--angle", type=float, default=35,
+                        help="The angle of the diagonal in degrees")
+    parser.add_argument("--no-flip", action="store_true",
+                        help="Do not mirror the diagonal")
+    parser.add_argument("-c", "--columns", type=int, default=2,
+                        help="The number of columns of the grid layout")
+    parser.add_argument("--crop-width", type=int, default=0,
+                        help="The amount to crop from each side of every image")
+    parser.add_argument("-m", "--manifest",
+                        help="A file with one JSON job per line")
+    args = parser.parse_args(argv)
+
+    if args.manifest:
+        run_manifest(args.manifest)
+        return
+    if not args.inputs:
+        parser.error("either inputs or --manifest is required")
+    job = {
+        "layout": args.layout,
+        "inputs": args.inputs,
+        "output": args.output,
+        "angle": args.angle,
+        "flip": not args.no_flip,
+        "columns": args.columns,
+        "crop_width": args.crop_width,
+    }
+    try:
+        print(f"Saved {compose(job)}")
+    except (FileNotFoundError, ValueError) as error:
+        print(f"Error: {error}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
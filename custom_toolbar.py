@@ -1,24 +1,32 @@
 """
 This file contains the CustomToolbar class, which is a subclass of the
 NavigationToolbar class from matplotlib. It is used to create a custom toolbar
-for the image editor.
+for the image editor. The FastToolbar class has the same buttons for the fast
+canvas, which is not a Matplotlib figure.
 """
 
+import os
 from PyQt5.QtWidgets import QPushButton, QSlider, \
     QFileDialog, QComboBox, QMessageBox, QStyle
 from PyQt5.QtGui import QPixmap, QColor, QIcon
-from PyQt5.QtWidgets import QInputDialog, QFileDialog, QSlider, QStyle
-import matplotlib.colors as mcolors
+from PyQt5.QtCore import Qt, QSize
+from PyQt5.QtWidgets import QInputDialog, QFileDialog, QSlider, QStyle, QToolBar, QSpinBox, \
+    QColorDialog, QProgressDialog
 from matplotlib.backends.backend_qt5 import NavigationToolbar2QT as NavigationToolbar
+import pixelation
+from export import ExportJob, print_report
+from export_worker import ExportWorker
+from sweep_view import SweepWindow
+from layers import PROJECT_SUFFIX
+from image_browser import ImageBrowser
 
 
-class CustomToolbar(NavigationToolbar):
+class EditorActions:
     """
-    Class to represent the custom toolbar for the image editor.
+    Mixin with the buttons and actions of the image editor, shared by the
+    toolbar of the Matplotlib board and the toolbar of the fast canvas.
     """
-    def __init__(self, canvas, parent=None, board_gui=None):
-        super().__init__(canvas, parent)
-        self.clear()
+    def init_editor_actions(self, board_gui):
         self.color_plate_combobox = None
         self.reset_button = None
         self.exit_button = None
@@ -28,18 +36,42 @@ class CustomToolbar(NavigationToolbar):
         self.load_button = None
         self.image_editor = None
         self.undo_button = None
+        self.grid_button = None
+        self.zoom_in_button = None
+        self.zoom_out_button = None
+        self.zoom_fit_button = None
+        self.fill_button = None
+        self.fill_connectivity_combobox = None
+        self.fill_tolerance_spinbox = None
+        self.edit_color_button = None
+        self.kernel_combobox = None
+        self.sweep_button = None
+        self.layers_button = None
+        self.image_browser = None
+        self.sweep_window = None
         self.colors = []
+        # the exports running in the background
+        self.exports = []
+        # swatch icons by color, so a changed palette does not repaint them all
+        self._swatch_icons = {}
         self.board_gui = board_gui
         self.init_buttons()
 
     def init_buttons(self):
         self.init_color_palette()
+        self.init_edit_color_button()
+        self.init_layers_button()
         self.init_reset_button()
         self.init_pixel_size_slider()
+        self.init_kernel_combobox()
         self.init_save_button()
         self.init_num_colors_button()
+        self.init_sweep_button()
         self.init_load_button()
         self.init_undo_button()
+        self.init_fill_tool()
+        self.init_grid_button()
+        self.init_zoom_buttons()
         self.init_exit_button()
 
     def init_color_palette(self):
@@ -60,11 +92,175 @@ class CustomToolbar(NavigationToolbar):
                 image: url("down-arrow.png");
             }
         """)
+        self.color_plate_combobox.setIconSize(QSize(20, 20))
         self.updat_color_palette(self.board_gui.image_editor)
         self.color_plate_combobox.currentIndexChanged.connect(
             self._on_color_plate_selected)
+        self.board_gui.cells_changed.connect(self._on_cells_changed)
         self.addWidget(self.color_plate_combobox)
 
+    def init_edit_color_button(self):
+        """
+        Initialize the button to recolor, merge or swap palette colors.
+        """
+        self.edit_color_button = QPushButton("Edit Color", self)
+        self.edit_color_button.setToolTip(
+            "Change the selected color everywhere in the image")
+        self.edit_color_button.clicked.connect(self.edit_color)
+        self.edit_color_button.setStyleSheet("""
+            QPushButton {
+                background-color: #333;
+                color: #fff;
+                border: 1px solid #000;
+                padding: 10px;
+                font-size: 18px;
+            }
+            QPushButton:hover {
+                background-color: #666;
+            }
+            QPushButton:pressed {
+                background-color: #999;
+            }
+        """)
+        self.addWidget(self.edit_color_button)
+
+    def edit_color(self):
+        """
+        Open dialog boxes to replace the selected palette color, merge it into
+        another color, or swap it with another color.
+        """
+        if not self.colors:
+            return
+        color = self.colors[self.color_plate_combobox.currentIndex()]
+        action, ok = QInputDialog.getItem(
+            self, "Edit Color", "Choose an action:",
+            ["Replace", "Merge into", "Swap with", "Remove unused colors"], 0, False)
+        if not ok:
+            return
+        if action == "Remove unused colors":
+            print(f"Removed {self.image_editor.remove_unused_colors()} unused colors")
+            self.updat_color_palette(self.image_editor)
+            return
+        index = self.image_editor.palette_index(color)
+        if action == "Replace":
+            new_color = QColorDialog.getColor(QColor(*color), self)
+            if not new_color.isValid():
+                return
+            self.image_editor.replace_palette_color(
+                index, (new_color.red(), new_color.green(), new_color.blue()))
+        else:
+            others = [other for other in self.colors if other != color]
+            if not others:
+                return
+            names = ["#{:02x}{:02x}{:02x}".format(*other[:3]) for other in others]
+            name, ok = QInputDialog.getItem(
+                self, "Edit Color", f"{action}:", names, 0, False)
+            if not ok:
+                return
+            other = self.image_editor.palette_index(others[names.index(name)])
+            if action == "Merge into":
+                self.image_editor.merge_palette_colors(index, other)
+            else:
+                self.image_editor.swap_palette_colors(index, other)
+        self.board_gui.display_image()
+        self.updat_color_palette(self.image_editor)
+
+    def init_layers_button(self):
+        """
+        Initialize the button that manages the layers and the project file.
+        """
+        self.layers_button = QPushButton("Layers", self)
+        self.layers_button.setToolTip("Paint layers, background removal and projects")
+        self.layers_button.clicked.connect(self.edit_layers)
+        self.layers_button.setStyleSheet("""
+            QPushButton {
+                background-color: #333;
+                color: #fff;
+                border: 1px solid #000;
+                padding: 10px;
+                font-size: 18px;
+            }
+            QPushButton:hover {
+                background-color: #666;
+            }
+            QPushButton:pressed {
+                background-color: #999;
+            }
+        """)
+        self.addWidget(self.layers_button)
+
+    def edit_layers(self):
+        """
+        Open dialog boxes to add, choose, show, hide or delete layers, and to
+        save or open a project.
+        """
+        editor = self.image_editor
+        action, ok = QInputDialog.getItem(
+            self, "Layers", "Choose an action:",
+            ["Paint on layer", "Show or hide layer", "Add paint layer",
+             "Remove background", "Delete layer", "Save project", "Open project"],
+            0, False)
+        if not ok:
+            return
+        if action == "Add paint layer":
+            editor.add_paint_layer()
+        elif action == "Remove background":
+            print(f"{editor.remove_background()} cells made transparent")
+        elif action == "Save project":
+            file_path, _ = QFileDialog.getSaveFileName(
+                self, "Save Project", "", f"Pixel art projects (*{PROJECT_SUFFIX})")
+            if file_path:
+                editor.save_project(file_path)
+            return
+        elif action == "Open project":
+            file_path, _ = QFileDialog.getOpenFileName(
+                self, "Open Project", "", f"Pixel art projects (*{PROJECT_SUFFIX})")
+            if not file_path:
+                return
+            try:
+                editor.open_project(file_path)
+            except (OSError, ValueError, KeyError) as error:
+                QMessageBox.warning(self, "Open Project", f"Could not open the project: {error}")
+                return
+            self.pixel_size_slider.blockSignals(True)
+            self.pixel_size_slider.setValue(editor.pixel_size)
+            self.pixel_size_slider.blockSignals(False)
+        else:
+            # the top layer first, as they are drawn
+            positions = list(range(len(editor.layers.layers)))[::-1]
+            if action == "Delete layer":
+                positions.remove(0)
+            if not positions:
+                return
+            names = [self.layer_label(editor, position) for position in positions]
+            name, ok = QInputDialog.getItem(self, "Layers", f"{action}:", names, 0, False)
+            if not ok:
+                return
+            position = positions[names.index(name)]
+            if action == "Paint on layer":
+                editor.set_active_layer(position)
+                return
+            if action == "Show or hide layer":
+                editor.set_layer_visible(
+                    position, not editor.layers.layers[position].visible)
+            else:
+                editor.remove_layer(position)
+        self.board_gui.display_image()
+        self.updat_color_palette(editor)
+
+    @staticmethod
+    def layer_label(image_editor, position):
+        """
+        Return the label of a layer: its position, name, kind and state.
+        """
+        layer = image_editor.layers.layers[position]
+        states = [layer.kind]
+        if not layer.visible:
+            states.append("hidden")
+        if position == image_editor.layers.active:
+            states.append("painting")
+        return f"{position}: {layer.name} ({', '.join(states)})"
+
     def init_reset_button(self):
         # Set text to an empty string
         self.reset_button = QPushButton("", self)
@@ -117,6 +313,19 @@ class CustomToolbar(NavigationToolbar):
             self._on_pixel_size_slider_changed)
         self.addWidget(self.pixel_size_slider)
 
+    def init_kernel_combobox(self):
+        """
+        Initialize the combobox that selects how blocks of the image become cells.
+        """
+        self.kernel_combobox = QComboBox(self)
+        self.kernel_combobox.setToolTip("Downsampling kernel")
+        for kernel in pixelation.KERNELS:
+            self.kernel_combobox.addItem(kernel.capitalize(), kernel)
+        self.kernel_combobox.setCurrentIndex(
+            pixelation.KERNELS.index(self.image_editor.kernel))
+        self.kernel_combobox.currentIndexChanged.connect(self._on_kernel_selected)
+        self.addWidget(self.kernel_combobox)
+
     def init_exit_button(self):
         """
         Initialize the exit button.
@@ -192,6 +401,50 @@ class CustomToolbar(NavigationToolbar):
         self.board_gui.display_image()
         self.updat_color_palette(self.board_gui.image_editor)
 
+    def init_sweep_button(self):
+        """
+        Initialize the button that opens the contact sheet of pixel sizes and colors.
+        """
+        self.sweep_button = QPushButton("Sweep", self)
+        self.sweep_button.setToolTip("Compare pixel sizes and color counts")
+        self.sweep_button.clicked.connect(self.open_sweep)
+        self.sweep_button.setStyleSheet("""
+            QPushButton {
+                background-color: #333;
+                color: #fff;
+                border: 1px solid #000;
+                padding: 10px;
+                font-size: 18px;
+            }
+            QPushButton:hover {
+                background-color: #666;
+            }
+            QPushButton:pressed {
+                background-color: #999;
+            }
+        """)
+        self.addWidget(self.sweep_button)
+
+    def open_sweep(self):
+        """
+        Show the contact sheet and start its sweep.
+        """
+        if self.sweep_window is None:
+            self.sweep_window = SweepWindow(self.image_editor, self)
+            self.sweep_window.chosen.connect(self._on_sweep_chosen)
+        self.sweep_window.show()
+        self.sweep_window.raise_()
+        self.sweep_window.run()
+
+    def _on_sweep_chosen(self, pixel_size, num_colors):
+        self.image_editor.apply_settings(pixel_size, num_colors)
+        # follow the new pixel size without pixelating again
+        self.pixel_size_slider.blockSignals(True)
+        self.pixel_size_slider.setValue(pixel_size)
+        self.pixel_size_slider.blockSignals(False)
+        self.board_gui.display_image()
+        self.updat_color_palette(self.image_editor)
+
     def init_save_button(self):
         self.save_button = QPushButton("", self)
         self.save_button.setIcon(
@@ -228,6 +481,9 @@ class CustomToolbar(NavigationToolbar):
             "Transparent", QMessageBox.ActionRole)
         cancel_button = msg_box.addButton("Cancel", QMessageBox.RejectRole)
         gif_button = msg_box.addButton("GIF", QMessageBox.ActionRole)
+        indexed_button = msg_box.addButton("Indexed", QMessageBox.ActionRole)
+        indexed_button.setToolTip(
+            "One pixel per cell, only the colors used, at the given scales")
         msg_box.exec_()
         saving_format = None
         if msg_box.clickedButton() == normal_button:
@@ -236,6 +492,8 @@ class CustomToolbar(NavigationToolbar):
             saving_format = "Transparent"
         elif msg_box.clickedButton() == gif_button:
             saving_format = "GIF"
+        elif msg_box.clickedButton() == indexed_button:
+            saving_format = "Indexed"
         if saving_format:
             file_dialog = QFileDialog()
             file_dialog.setAcceptMode(QFileDialog.AcceptSave)
@@ -247,15 +505,69 @@ class CustomToolbar(NavigationToolbar):
             if file_path:
                 file_name = file_path.split("/")[-1]
             if file_name:  # Check if a file name was provided
+                options = {}
                 if saving_format == "Normal":
-                    self.image_editor.save_image(file_name)
+                    kind = "png"
+                elif saving_format == "Indexed":
+                    kind = "indexed"
+                    scales, ok = QInputDialog.getText(
+                        self, "Indexed PNG", "Scales (pixels per cell):",
+                        text=f"1 {self.image_editor.pixel_size}")
+                    if not ok:
+                        return
+                    options["scales"] = sorted(
+                        {int(scale) for scale in scales.split()
+                         if scale.isdigit() and int(scale) > 0}) or [1]
                 elif saving_format == "GIF":
+                    kind = "gif"
                     # change the file name to a gif file
-                    file_name = file_name.split(".")[0] + ".gif"
-                    self.image_editor.make_gif(file_name)
+                    file_path = os.path.splitext(file_path)[0] + ".gif"
                 else:
-                    self.image_editor.save_transparent_png(
-                        file_path, file_name)
+                    kind = "transparent"
+                    file_path = os.path.splitext(file_path)[0] + ".png"
+                self.start_export(
+                    ExportJob(self.image_editor.snapshot(), kind, file_path, **options))
+
+    def start_export(self, job):
+        """
+        Run an export in the background, with a progress dialog to cancel it.
+        The export works on a snapshot, so editing can go on meanwhile.
+        """
+        worker = ExportWorker(job, self)
+        dialog = QProgressDialog(
+            f"Saving {os.path.basename(job.path)}", "Cancel", 0, 0, self)
+        dialog.setWindowTitle("Save Image")
+        dialog.setWindowModality(Qt.NonModal)
+        dialog.setMinimumDuration(500)
+        dialog.setAutoClose(False)
+        dialog.canceled.connect(worker.cancel)
+
+        def progressed(steps, total_steps, bytes_written):
+            dialog.setMaximum(total_steps)
+            dialog.setValue(steps)
+            dialog.setLabelText(
+                f"Saving {os.path.basename(job.path)}: {steps}/{total_steps}, "
+                f"{bytes_written // 1024} KB written")
+
+        def finished():
+            dialog.close()
+            self.exports.remove(worker)
+
+        worker.progressed.connect(progressed)
+        def succeeded(paths):
+            if job.report:
+                print_report(job.report)
+            else:
+                print(f"Saved {', '.join(paths)}")
+
+        worker.succeeded.connect(succeeded)
+        worker.cancelled.connect(lambda: print(f"Cancelled saving {job.path}"))
+        worker.failed.connect(
+            lambda error: QMessageBox.warning(self, "Save Image", error))
+        worker.finished.connect(finished)
+        # keep the worker alive until it is done
+        self.exports.append(worker)
+        worker.start()
 
     def reset_image(self):
         self.image_editor.reset_image()
@@ -263,25 +575,58 @@ class CustomToolbar(NavigationToolbar):
 
     def _on_pixel_size_slider_changed(self):
         self.image_editor.change_pixel_size(self.pixel_size_slider.value())
-        print(self.pixel_size_slider.value())
-        print(self.image_editor.pixel_size)
+        self.board_gui.display_image()
+
+    def _on_kernel_selected(self):
+        self.image_editor.change_kernel(self.kernel_combobox.currentData())
+        self.updat_color_palette(self.image_editor)
         self.board_gui.display_image()
 
     def updat_color_palette(self, image_editor):
-        self.colors = image_editor.color_palette
+        """
+        Show the colors of the image editor and how many cells use each one.
+        Only the swatches whose color or usage changed are updated, the list
+        is only rebuilt when the colors themselves change.
+        """
+        changed = image_editor.usage.take_changed(image_editor.palette)
+        if self.colors == image_editor.color_palette:
+            for row, color in enumerate(self.colors):
+                if color in changed:
+                    self.color_plate_combobox.setItemText(
+                        row, self.swatch_text(image_editor, color))
+            return
+        self.colors = list(image_editor.color_palette)
+        # rebuilding the list must not change the paint color
+        self.color_plate_combobox.blockSignals(True)
         self.color_plate_combobox.clear()
-        print(self.colors)
         for color in self.colors:
-            # convert to RGBA
-            color = (color[0]/255, color[1]/255, color[2]/255, 1)
-            hex_color = mcolors.to_hex(color)
-            # Create a QPixmap, fill it with the color, and create an QIcon from it
+            self.color_plate_combobox.addItem(
+                self.swatch_icon(color), self.swatch_text(image_editor, color))
+        if image_editor.paint_color in self.colors:
+            self.color_plate_combobox.setCurrentIndex(
+                self.colors.index(image_editor.paint_color))
+        self.color_plate_combobox.blockSignals(False)
+
+    def swatch_icon(self, color):
+        """
+        Return the icon of a color, painted once per color.
+        """
+        if color not in self._swatch_icons:
             pixmap = QPixmap(20, 20)
-            pixmap.fill(QColor(hex_color))
-            icon = QIcon(pixmap)
-            # paint the color on the combobox
-            self.color_plate_combobox.addItem(icon, f'{hex_color}')
-            self.color_plate_combobox.setIconSize(pixmap.rect().size())
+            pixmap.fill(QColor(*color))
+            self._swatch_icons[color] = QIcon(pixmap)
+        return self._swatch_icons[color]
+
+    @staticmethod
+    def swatch_text(image_editor, color):
+        """
+        Return the label of a color: its hex code and how many cells use it.
+        """
+        return "#{:02x}{:02x}{:02x}  {}".format(
+            *color[:3], image_editor.color_usage(color))
+
+    def _on_cells_changed(self):
+        self.updat_color_palette(self.image_editor or self.board_gui.image_editor)
 
     def _on_color_plate_selected(self):
         # make sure color plate matches
@@ -289,12 +634,11 @@ class CustomToolbar(NavigationToolbar):
             self.updat_color_palette(self.image_editor)
         # update the default color
         color = self.colors[self.color_plate_combobox.currentIndex()]
-        print(color)
         self.image_editor.change_color(color)
 
     def init_load_button(self):
         self.load_button = QPushButton("Load", self)
-        self.load_button.setToolTip("Load Image")
+        self.load_button.setToolTip("Browse the images of a folder")
         self.load_button.clicked.connect(self.load_image)
         self.load_button.setStyleSheet("""
             QPushButton {
@@ -315,10 +659,24 @@ class CustomToolbar(NavigationToolbar):
 
     def load_image(self):
         """
-        Open a dialog box to load an image from the user's computer.
+        Open the browser of the images in the folder of the current image.
         """
-        self.board_gui.image_editor.load_image()
+        if self.image_browser is None:
+            folder = os.path.dirname(os.path.abspath(self.image_editor.image_path))
+            self.image_browser = ImageBrowser(self.image_editor, folder, self)
+            self.image_browser.opened.connect(self._on_image_opened)
+        self.image_browser.show()
+        self.image_browser.raise_()
+        self.image_browser.show_folder()
+
+    def _on_image_opened(self, path):
+        try:
+            self.image_editor.open_image(path)
+        except (OSError, ValueError) as error:
+            QMessageBox.warning(self, "Open Image", f"Could not open {path}: {error}")
+            return
         self.board_gui.display_image()
+        self.updat_color_palette(self.image_editor)
 
     def init_undo_button(self):
         self.undo_button = QPushButton("", self)
@@ -348,4 +706,141 @@ class CustomToolbar(NavigationToolbar):
         Undo the last action.
         """
         self.image_editor.undo()
+        # follow the restored settings without pixelating again
+        for widget in (self.pixel_size_slider, self.kernel_combobox):
+            widget.blockSignals(True)
+        self.pixel_size_slider.setValue(self.image_editor.pixel_size)
+        self.kernel_combobox.setCurrentIndex(
+            pixelation.KERNELS.index(self.image_editor.kernel))
+        for widget in (self.pixel_size_slider, self.kernel_combobox):
+            widget.blockSignals(False)
         self.board_gui.display_image()
+        self.updat_color_palette(self.image_editor)
+
+    def init_grid_button(self):
+        """
+        Initialize the button to show or hide the pixel grid.
+        """
+        self.grid_button = QPushButton("Grid", self)
+        self.grid_button.setToolTip("Show or hide the pixel grid")
+        self.grid_button.setCheckable(True)
+        self.grid_button.clicked.connect(self.board_gui.turn_on_grid)
+        self.grid_button.setStyleSheet("""
+            QPushButton {
+                background-color: #333;
+                color: #fff;
+                border: 1px solid #000;
+                padding: 10px;
+                font-size: 18px;
+            }
+            QPushButton:hover {
+                background-color: #666;
+            }
+            QPushButton:checked {
+                background-color: #999;
+            }
+        """)
+        self.addWidget(self.grid_button)
+
+    def init_zoom_buttons(self):
+        """
+        Initialize the zoom in, zoom out and fit buttons.
+        """
+        self.zoom_in_button = QPushButton("+", self)
+        self.zoom_in_button.setToolTip("Zoom in")
+        self.zoom_in_button.clicked.connect(self.board_gui.zoom_in)
+        self.zoom_out_button = QPushButton("-", self)
+        self.zoom_out_button.setToolTip("Zoom out")
+        self.zoom_out_button.clicked.connect(self.board_gui.zoom_out)
+        self.zoom_fit_button = QPushButton("Fit", self)
+        self.zoom_fit_button.setToolTip("Show the whole image")
+        self.zoom_fit_button.clicked.connect(self.board_gui.zoom_fit)
+        for button in (self.zoom_in_button, self.zoom_out_button,
+                       self.zoom_fit_button):
+            button.setStyleSheet("""
+                QPushButton {
+                    background-color: #333;
+                    color: #fff;
+                    border: 1px solid #000;
+                    padding: 10px;
+                    font-size: 18px;
+                }
+                QPushButton:hover {
+                    background-color: #666;
+                }
+                QPushButton:pressed {
+                    background-color: #999;
+                }
+            """)
+            self.addWidget(button)
+
+    def init_fill_tool(self):
+        """
+        Initialize the bucket fill button and its options.
+        """
+        self.fill_button = QPushButton("Fill", self)
+        self.fill_button.setToolTip("Bucket fill: click to fill a region")
+        self.fill_button.setCheckable(True)
+        self.fill_button.toggled.connect(self._on_fill_toggled)
+        self.fill_button.setStyleSheet("""
+            QPushButton {
+                background-color: #333;
+                color: #fff;
+                border: 1px solid #000;
+                padding: 10px;
+                font-size: 18px;
+            }
+            QPushButton:hover {
+                background-color: #666;
+            }
+            QPushButton:checked {
+                background-color: #999;
+            }
+        """)
+        self.addWidget(self.fill_button)
+
+        self.fill_connectivity_combobox = QComboBox(self)
+        self.fill_connectivity_combobox.setToolTip("Fill connectivity")
+        self.fill_connectivity_combobox.addItem("4-way", 4)
+        self.fill_connectivity_combobox.addItem("8-way", 8)
+        self.fill_connectivity_combobox.currentIndexChanged.connect(
+            self._on_fill_options_changed)
+        self.addWidget(self.fill_connectivity_combobox)
+
+        self.fill_tolerance_spinbox = QSpinBox(self)
+        self.fill_tolerance_spinbox.setToolTip("Fill color tolerance")
+        self.fill_tolerance_spinbox.setRange(0, 255)
+        self.fill_tolerance_spinbox.valueChanged.connect(
+            self._on_fill_options_changed)
+        self.addWidget(self.fill_tolerance_spinbox)
+
+    def _on_fill_toggled(self, checked):
+        self.board_gui.tool = "fill" if checked else "draw"
+
+    def _on_fill_options_changed(self):
+        self.board_gui.fill_connectivity = self.fill_connectivity_combobox.currentData()
+        self.board_gui.fill_tolerance = self.fill_tolerance_spinbox.value()
+
+
+class CustomToolbar(EditorActions, NavigationToolbar):
+    """
+    Class to represent the custom toolbar for the image editor on the
+    Matplotlib board.
+    """
+    def __init__(self, canvas, parent=None, board_gui=None):
+        super().__init__(canvas, parent)
+        # the board zooms (wheel, buttons) and pans (right or middle button
+        # drag) itself, on the visible cells only, see BoardGUI.draw_view
+        self.clear()
+        self.init_editor_actions(board_gui)
+
+
+class FastToolbar(EditorActions, QToolBar):
+    """
+    Class to represent the toolbar for the image editor on the fast canvas,
+    which has no Matplotlib figure to navigate.
+    """
+    def __init__(self, canvas, parent=None, board_gui=None):
+        QToolBar.__init__(self, parent)
+        self.canvas = canvas
+        self.init_editor_actions(board_gui)
@@ -0,0 +1,326 @@
+"""
+This module contains the DiskCache class, a persistent cache of pixelation
+results shared by the editor, the batch tools and the GIF export, across
+sessions and processes.
+
+An entry is the logical grid of one source image pixelated with one set of
+parameters, stored as a compact indexed PNG (palette included). Entries are
+keyed by the hash of the source content, the parameters and the pipeline
+version, so editing a source or changing the pipeline never serves a stale
+result. Entries are written atomically, and the least recently used ones are
+evicted when the cache grows over its size limit.
+
+The cache lives in ~/.cache/pixel-art unless the PIXEL_ART_CACHE environment
+variable names another folder, or is "off" to disable it.
+
+Usage:
+    python3 disk_cache.py
+    python3 disk_cache.py --clear
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from PIL import Image
+from PIL.PngImagePlugin import PngInfo
+import pixelation
+
+try:
+    import fcntl
+except ImportError:  # Windows: eviction is not serialized between processes
+    fcntl = None
+
+DEFAULT_DIRECTORY = os.path.join(os.path.expanduser("~"), ".cache", "pixel-art")
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+ENTRY_SUFFIX = ".png"
+
+
+def hash_bytes(data):
+    """
+    Return the content hash of the bytes of a source image.
+    """
+    return hashlib.sha256(data).hexdigest()
+
+
+class DiskCache:
+    """
+    Class to represent the on-disk cache of pixelated grids.
+    """
+
+    def __init__(self, directory=DEFAULT_DIRECTORY, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # the prefetch thread and the GUI thread update the statistics
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        # how the sources of the computed entries were decoded, see pixelation.load
+        self.loads = Counter()
+        # bytes in the cache as far as this process knows, None until scanned
+        self._size = None
+        # content hashes of source files, by (path, size, modification time)
+        self._digests = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def file_digest(self, path):
+        """
+        Return the content hash of a source file, read once per file version.
+        """
+        status = os.stat(path)
+        version = (os.path.abspath(path), status.st_size, status.st_mtime_ns)
+        if version not in self._digests:
+            with open(path, "rb") as file:
+                self._digests[version] = hash_bytes(file.read())
+        return self._digests[version]
+
+    def key(self, digest, params):
+        """
+        Return the key of a source content hash and the pipeline parameters.
+        """
+        text = json.dumps([pixelation.PIPELINE_VERSION, digest, params], sort_keys=True)
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key + ENTRY_SUFFIX)
+
+    def get(self, digest, params):
+        """
+        Return the cached grid as an image, or None.
+        """
+        path = self.path(self.key(digest, params))
+        try:
+            with Image.open(path) as image:
+                image.load()
+            # the modification time is the last use, for the LRU eviction
+            os.utime(path)
+        except (OSError, SyntaxError):
+            # missing, evicted by another process meanwhile, or unreadable
+            with self._stats_lock:
+                self.misses += 1
+            return None
+        transparency = image.info.get("transparency")
+        if isinstance(transparency, bytes) and transparency.count(255) == len(transparency):
+            # the encoder writes an opaque alpha table for palettes with an
+            # alpha channel, which the grid that was stored did not have
+            del image.info["transparency"]
+        with self._stats_lock:
+            self.hits += 1
+        return image
+
+    def put(self, digest, params, grid):
+        """
+        Store a grid. The entry appears complete or not at all, so other
+        processes never read a partial file.
+        """
+        path = self.path(self.key(digest, params))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        handle, temporary = tempfile.mkstemp(suffix=".part", dir=os.path.dirname(path))
+        try:
+            # the load path of the grid is kept as a text chunk
+            text = PngInfo()
+            if "load" in grid.info:
+                text.add_text("load", grid.info["load"])
+            with os.fdopen(handle, "wb") as file:
+                # fast compression: entries are read far more often than written
+                grid.save(file, "PNG", compress_level=1, icc_profile=None, pnginfo=text)
+            size = os.path.getsize(temporary)
+            os.replace(temporary, path)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        with self._stats_lock:
+            self.writes += 1
+            if self._size is None:
+                self._size = self.scan()[1]
+            else:
+                self._size += size
+            full = self._size > self.max_bytes
+        if full:
+            self.evict()
+
+    @staticmethod
+    def params(pixel_size, num_colors=None, palette=None, kernel="nearest"):
+        """
+        Return the parameters of pixelation.pixelate as they are keyed.
+        """
+        params = {"pixel_size": pixel_size, "num_colors": num_colors, "kernel": kernel}
+        if palette is not None:
+            params["palette"] = hash_bytes(bytes(palette.getpalette()))
+        return params
+
+    def pixelate(self, source, pixel_size, num_colors=None, palette=None,
+                 kernel="nearest", digest=None):
+        """
+        Return the logical grid of a source image, from the cache or computed
+        with pixelation.pixelate and stored.
+
+        :param source: An image file path, or an image together with digest.
+        :param digest: The content hash of an image source.
+        """
+        if digest is None:
+            digest = self.file_digest(source)
+        params = self.params(pixel_size, num_colors, palette, kernel)
+        grid = self.get(digest, params)
+        if grid is None:
+            if isinstance(source, str):
+                grid = pixelation.pixelate_file(source, pixel_size, num_colors,
+                                                palette, kernel)
+                with self._stats_lock:
+                    self.loads[grid.info["load"]] += 1
+            else:
+                grid = pixelation.pixelate(source, pixel_size, num_colors,
+                                           palette, kernel)
+            self.put(digest, params, grid)
+        return grid
+
+    def entries(self):
+        """
+        Return the (path, size, last use) of every entry.
+        """
+        entries = []
+        for folder in os.scandir(self.directory):
+            if not folder.is_dir():
+                continue
+            for entry in os.scandir(folder.path):
+                if entry.name.endswith(ENTRY_SUFFIX):
+                    try:
+                        status = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((entry.path, status.st_size, status.st_mtime))
+        return entries
+
+    def scan(self):
+        """
+        Return the number of entries and their total size in bytes.
+        """
+        entries = self.entries()
+        return len(entries), sum(size for _, size, _ in entries)
+
+    @contextmanager
+    def _lock(self):
+        """
+        Hold the eviction lock, so only one process evicts at a time.
+        """
+        with open(os.path.join(self.directory, ".lock"), "a") as file:
+            if fcntl is not None:
+                fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(file, fcntl.LOCK_UN)
+
+    def evict(self):
+        """
+        Delete the least recently used entries until the cache is back to
+        90% of its size limit.
+        """
+        evictions = 0
+        with self._lock():
+            entries = sorted(self.entries(), key=lambda entry: entry[2])
+            size = sum(entry[1] for entry in entries)
+            for path, entry_size, _ in entries:
+                if size <= self.max_bytes * 0.9:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                size -= entry_size
+                evictions += 1
+        with self._stats_lock:
+            self.evictions += evictions
+            self._size = size
+
+    def clear(self):
+        """
+        Delete every entry.
+        """
+        with self._lock():
+            for path, _, _ in self.entries():
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        with self._stats_lock:
+            self._size = 0
+
+    def stats(self):
+        """
+        Return the statistics of this process and the size of the cache.
+        """
+        entries, size = self.scan()
+        with self._stats_lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "writes": self.writes,
+                "evictions": self.evictions,
+                "loads": dict(self.loads),
+                "entries": entries,
+                "bytes": size,
+            }
+
+
+_default_cache = None
+
+
+def default_cache():
+    """
+    Return the cache shared by the tools of this process, or None if the
+    PIXEL_ART_CACHE environment variable is "off".
+    """
+    global _default_cache
+    directory = os.environ.get("PIXEL_ART_CACHE", DEFAULT_DIRECTORY)
+    if directory.lower() in ("off", "0", "none", ""):
+        return None
+    if _default_cache is None or _default_cache.directory != directory:
+        try:
+            _default_cache = DiskCache(directory)
+        except OSError as error:
+            print(f"Cache disabled: {error}")
+            return None
+    return _default_cache
+
+
+def pixelate_file(path, pixel_size, num_colors=None, palette=None, kernel="nearest"):
+    """
+    Return the logical grid of an image file, through the shared cache when
+    it is enabled.
+    """
+    cache = default_cache()
+    if cache is not None:
+        return cache.pixelate(path, pixel_size, num_colors, palette, kernel)
+    return pixelation.pixelate_file(path, pixel_size, num_colors, palette, kernel)
+
+
+def main(argv=None):
+    """
+    The command line entry point.
+    """
+    parser = argparse.ArgumentParser(description="Inspect the pixelation cache.")
+    parser.add_argument("--directory", default=os.environ.get(
+        "PIXEL_ART_CACHE", DEFAULT_DIRECTORY))
+    parser.add_argument("--clear", action="store_true", help="Delete every entry")
+    args = parser.parse_args(argv)
+    cache = DiskCache(args.directory)
+    if args.clear:
+        cache.clear()
+        print(f"Cleared {args.directory}")
+    entries, size = cache.scan()
+    print(f"{args.directory}: {entries} entries, {size / 1024 / 1024:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,376 @@
+"""
+This module exports pixel art as compact indexed PNG files: the logical grid
+(one pixel per cell) is written with only the colors it uses, at the smallest
+bit depth that fits them (1, 2, 4 or 8 bits per pixel), and every requested
+integer scale is written from the same in-memory grid.
+
+It also contains the ExportJob class, which runs any export of the editor
+against a snapshot of its state, so it can run on a worker thread while the
+user keeps editing. Jobs report their progress, can be cancelled, and write
+to a temporary file that only replaces the output once it is complete.
+
+Usage:
+    python3 export.py images/Bruce.png --pixel-size 6 --num-colors 4 --scales 1 2 4 8
+    python3 export.py sprites/ --output exported/ --scales 1 4 --optimize
+"""
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+import numpy as np
+from PIL import Image
+import pixelation
+import disk_cache
+from sprite_sheet import collect_images
+from video_converter import GifStreamWriter
+
+EXPORT_KINDS = ("png", "transparent", "indexed", "gif")
+
+# the state of the editor an export needs, copied so the editor can change meanwhile
+EditorSnapshot = namedtuple("EditorSnapshot", [
+    "image", "cells", "palette", "counts", "pixel_size", "num_colors", "kernel",
+    "image_path", "transparent_color", "alpha"])
+
+
+class ExportCancelled(Exception):
+    """
+    Raised inside an export when its job was cancelled.
+    """
+
+
+@contextmanager
+def atomic_output(path):
+    """
+    Yield a temporary path next to path, and move it over path only when the
+    block completes. A cancelled or failed export leaves path untouched.
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    handle, temporary = tempfile.mkstemp(
+        prefix=f".{name}.", suffix=".part", dir=directory)
+    os.close(handle)
+    try:
+        yield temporary
+        os.replace(temporary, path)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+
+
+class ProgressFile:
+    """
+    A file wrapper that counts the bytes written and stops the encoder with
+    ExportCancelled as soon as the job is cancelled.
+    """
+
+    def __init__(self, file, job):
+        self.file = file
+        self.job = job
+
+    def write(self, data):
+        self.job.check_cancelled()
+        written = self.file.write(data)
+        self.job.add_bytes(len(data))
+        return written
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+
+def bit_depth(num_colors):
+    """
+    Return the smallest PNG bit depth that can index num_colors colors.
+    """
+    for bits in (1, 2, 4):
+        if num_colors <= 1 << bits:
+            return bits
+    return 8
+
+
+def compact(cells, palette, counts=None):
+    """
+    Drop the palette entries no cell uses, fold the entries that share a
+    color (merged colors) into one, and renumber the cells.
+
+    :param cells: A 2D uint8 array of palette indices.
+    :param palette: The list of RGB colors the indices refer to.
+    :param counts: The number of cells per index, if already known.
+    :return: The renumbered cells and the list of used colors.
+    """
+    if counts is None:
+        counts = np.bincount(cells.ravel(), minlength=256)
+    used = np.flatnonzero(counts)
+    colors = list(dict.fromkeys(tuple(palette[index][:3]) for index in used))
+    lut = np.zeros(256, dtype=np.uint8)
+    lut[used] = [colors.index(tuple(palette[index][:3])) for index in used]
+    return lut[cells], colors
+
+
+def output_paths(output, scales):
+    """
+    Return the file of every scale: the output itself for a single scale,
+    name@2x.png and so on for several.
+    """
+    if len(scales) == 1:
+        return [output]
+    root, extension = os.path.splitext(output)
+    return [f"{root}@{scale}x{extension or '.png'}" for scale in scales]
+
+
+def export_grid(cells, palette, output, scales=(1,), optimize=False,
+                compress_level=9, transparent=None, counts=None, job=None, alpha=None):
+    """
+    Write the cells as indexed PNG files, one per scale.
+
+    :param cells: A 2D uint8 array of palette indices, one per cell.
+    :param palette: The list of RGB colors the indices refer to.
+    :param output: The file name, used as is for a single scale.
+    :param scales: The integer scales to write (screen pixels per cell).
+    :param optimize: Let the encoder search for the smallest encoding (slower).
+    :param compress_level: The zlib compression level, 0 to 9.
+    :param transparent: A color of the palette to write as transparent.
+    :param counts: The number of cells per index, if already known.
+    :param job: The ExportJob to report progress to, if any.
+    :param alpha: The alpha of every cell, from the alpha layers: cells under
+        128 are written transparent.
+    :return: A report row per file: path, scale, size, bits, colors, bytes and ms.
+    """
+    hidden = None if alpha is None else alpha < 128
+    if hidden is not None and hidden.any():
+        # only the visible cells count, and the hidden ones get an entry of their own
+        cells, colors = compact(cells, palette, np.bincount(
+            cells[~hidden], minlength=256))
+        cells[hidden] = len(colors)
+        colors.append((0, 0, 0))
+        transparent = None
+    else:
+        hidden = None
+        cells, colors = compact(cells, palette, counts)
+    bits = bit_depth(len(colors))
+    grid = Image.fromarray(cells, "P")
+    grid.putpalette([channel for color in colors for channel in color])
+    options = {"bits": bits, "optimize": optimize, "compress_level": compress_level}
+    if hidden is not None:
+        options["transparency"] = len(colors) - 1
+    elif transparent is not None and tuple(transparent[:3]) in colors:
+        options["transparency"] = colors.index(tuple(transparent[:3]))
+    report = []
+    for scale, path in zip(scales, output_paths(output, scales)):
+        start = time.perf_counter()
+        image = grid if scale == 1 else pixelation.upscale(grid, scale)
+        if job is None:
+            image.save(path, "PNG", **options)
+        else:
+            job.save(image, path, "PNG", **options)
+            job.step()
+        report.append({
+            "path": path,
+            "scale": scale,
+            "size": image.size,
+            "bits": bits,
+            "colors": len(colors),
+            "bytes": os.path.getsize(path),
+            "ms": (time.perf_counter() - start) * 1000,
+        })
+    return report
+
+
+def flatten(snapshot):
+    """
+    Return the image of a snapshot with the alpha of its layers applied.
+    """
+    if snapshot.alpha is None:
+        return snapshot.image
+    image = snapshot.image.convert("RGBA")
+    alpha = Image.fromarray(snapshot.alpha, "L").resize(image.size, Image.NEAREST)
+    image.putalpha(alpha)
+    return image
+
+
+def export_image(path, output, pixel_size=6, num_colors=4, kernel="nearest", **options):
+    """
+    Pixelate an image file and export its logical grid, see export_grid for the options.
+    """
+    grid = disk_cache.pixelate_file(path, pixel_size, num_colors, kernel=kernel)
+    if grid.mode != "P":
+        grid = grid.convert("RGB").quantize(256, dither=Image.NONE)
+    return export_grid(np.array(grid, dtype=np.uint8),
+                       pixelation.palette_colors(grid), output, **options)
+
+
+class ExportJob:
+    """
+    Class to represent one export of the editor: a PNG, a transparent PNG, an
+    indexed PNG or the pixel size GIF, written from a snapshot of the editor.
+    """
+
+    def __init__(self, snapshot, kind, path, **options):
+        """
+        :param snapshot: The EditorSnapshot to export.
+        :param kind: One of EXPORT_KINDS.
+        :param path: The output file.
+        :param options: The scales and compression options of an indexed
+            export, or the number of frames of a GIF.
+        """
+        if kind not in EXPORT_KINDS:
+            raise ValueError(f"Unknown export: {kind}")
+        self.snapshot = snapshot
+        self.kind = kind
+        self.path = path
+        self.options = options
+        self.steps = 0
+        self.total_steps = 1
+        self.bytes_written = 0
+        self.report = []
+        # called with (steps done, total steps, bytes written), from the thread running the job
+        self.progress = None
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        """
+        Ask the job to stop. It stops at its next write, without touching the output.
+        """
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def check_cancelled(self):
+        """
+        Raise ExportCancelled if the job was cancelled.
+        """
+        if self._cancelled.is_set():
+            raise ExportCancelled(self.path)
+
+    def add_bytes(self, count):
+        self.bytes_written += count
+        self._report_progress()
+
+    def step(self):
+        self.steps += 1
+        self._report_progress()
+
+    def _report_progress(self):
+        if self.progress is not None:
+            self.progress(self.steps, self.total_steps, self.bytes_written)
+
+    def save(self, image, path, image_format, **options):
+        """
+        Encode an image to path atomically, counting the bytes written.
+        """
+        with atomic_output(path) as temporary:
+            with open(temporary, "wb") as file:
+                image.save(ProgressFile(file, self), image_format, **options)
+
+    def run(self):
+        """
+        Run the export and return the written paths. Raises ExportCancelled
+        if the job is cancelled before it completes.
+        """
+        self.check_cancelled()
+        snapshot = self.snapshot
+        if self.kind == "png":
+            self.save(flatten(snapshot), self.path, "PNG")
+            self.step()
+            return [self.path]
+        if self.kind == "transparent":
+            self.save(pixelation.make_transparent(
+                flatten(snapshot), snapshot.transparent_color), self.path, "PNG")
+            self.step()
+            return [self.path]
+        if self.kind == "indexed":
+            self.total_steps = len(self.options.get("scales", (1,)))
+            self.report = export_grid(snapshot.cells, snapshot.palette, self.path,
+                                      counts=snapshot.counts, job=self,
+                                      alpha=snapshot.alpha, **self.options)
+            return [row["path"] for row in self.report]
+        self.write_gif()
+        return [self.path]
+
+    def write_gif(self):
+        """
+        Write the GIF that grows the pixel size one step per frame from the
+        current state, then holds the most pixelated frame.
+        """
+        snapshot = self.snapshot
+        frames = self.options.get("frames", 19)
+        self.total_steps = frames
+        with atomic_output(self.path) as temporary:
+            # larger pixel sizes may round to a larger image than the first frame
+            writer = GifStreamWriter(temporary, size=snapshot.image.size)
+            try:
+                frame = snapshot.image
+                for index in range(frames):
+                    if index:
+                        pixel_size = snapshot.pixel_size + index
+                        frame = pixelation.upscale(disk_cache.pixelate_file(
+                            snapshot.image_path, pixel_size, snapshot.num_colors,
+                            kernel=snapshot.kernel), pixel_size)
+                    if frame.mode != "P":
+                        frame = frame.convert("RGB").quantize(256, dither=Image.NONE)
+                    self.check_cancelled()
+                    # the last frame is held for a longer pause
+                    writer.write(frame, 600 if index == frames - 1 else 100)
+                    self.bytes_written = writer.bytes_written
+                    self.step()
+            finally:
+                writer.close()
+            # the trailer
+            self.add_bytes(writer.bytes_written - self.bytes_written)
+
+
+def print_report(report):
+    """
+    Print the size and time of every exported file.
+    """
+    for row in report:
+        print(f"{row['path']}: {row['size'][0]}x{row['size'][1]} "
+              f"{row['colors']} colors {row['bits']}-bit, "
+              f"{row['bytes']} bytes in {row['ms']:.1f} ms")
+
+
+def main(argv=None):
+    """
+    The command line entry point.
+    """
+    parser = argparse.ArgumentParser(
+        description="Export pixelated images as compact indexed PNG files.")
+    parser.add_argument("inputs", nargs="+", help="Images or folders of images")
+    parser.add_argument("-o", "--output", default=".",
+                        help="The output folder, or the output file for a single image")
+    parser.add_argument("-p", "--pixel-size", type=int, default=6)
+    parser.add_argument("-c", "--num-colors", type=int, default=4)
+    parser.add_argument("-k", "--kernel", choices=pixelation.KERNELS, default="nearest")
+    parser.add_argument("-s", "--scales", type=int, nargs="+", default=[1])
+    parser.add_argument("--optimize", action="store_true")
+    parser.add_argument("--compress-level", type=int, choices=range(10), default=9)
+    args = parser.parse_args(argv)
+
+    paths = collect_images(args.inputs)
+    single_file = len(paths) == 1 and not os.path.isdir(args.output)
+    if not single_file:
+        os.makedirs(args.output, exist_ok=True)
+    total_bytes, start = 0, time.perf_counter()
+    for path in paths:
+        output = args.output if single_file else os.path.join(
+            args.output, os.path.splitext(os.path.basename(path))[0] + ".png")
+        report = export_image(
+            path, output, args.pixel_size, args.num_colors, args.kernel,
+            scales=args.scales, optimize=args.optimize,
+            compress_level=args.compress_level)
+        print_report(report)
+        total_bytes += sum(row["bytes"] for row in report)
+    print(f"{len(paths)} images, {total_bytes} bytes "
+          f"in {time.perf_counter() - start:.2f} s")
+    cache = disk_cache.default_cache()
+    if cache is not None:
+        print(f"Cache: {cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
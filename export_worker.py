@@ -0,0 +1,43 @@
+"""
+This module contains the ExportWorker class, which runs an ExportJob on a Qt
+thread and reports its progress with signals, so the window stays responsive
+while large images and GIFs are encoded.
+"""
+
+from PyQt5.QtCore import QThread, pyqtSignal
+from export import ExportCancelled
+
+
+class ExportWorker(QThread):
+    """
+    Class to represent a thread running one export.
+    """
+    # steps done, total steps, bytes written
+    progressed = pyqtSignal(int, int, int)
+    succeeded = pyqtSignal(list)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, job, parent=None):
+        super().__init__(parent)
+        self.job = job
+        # the job reports from this thread, the signal delivers it to the GUI thread
+        self.job.progress = self.progressed.emit
+
+    def cancel(self):
+        """
+        Stop the export. The output file is left as it was.
+        """
+        self.job.cancel()
+
+    def run(self):
+        try:
+            paths = self.job.run()
+        except ExportCancelled:
+            self.cancelled.emit()
+            return
+        except Exception as error:
+            # any error must reach the window, or its progress dialog stays open
+            self.failed.emit(str(error))
+            return
+        self.succeeded.emit(paths)
@@ -113,3 +113,4 @@ app = QApplication(sys.argv)
 window = GameboyAdvanceWindow()
 window.show()
 app.exec_()
+print(f"Prefetch: {window.main_window.image_editor.prefetcher.stats()}")
@@ -0,0 +1,168 @@
+"""
+This module contains the ImageBrowser class, a window that shows the images
+of a folder as pixelated previews made from the thumbnail index, so opening
+a folder of thousands of images decodes none of them. The folder is indexed
+again in the background, and only an image that is opened is decoded in full.
+"""
+
+import os
+from PyQt5.QtCore import Qt, QSize, QThread, pyqtSignal
+from PyQt5.QtGui import QImage, QPixmap, QIcon
+from PyQt5.QtWidgets import QWidget, QHBoxLayout, QVBoxLayout, QLabel, \
+    QPushButton, QListWidget, QListWidgetItem, QFileDialog, QApplication
+import pixelation
+from thumbnail_index import ThumbnailIndex, THUMBNAIL_SIZE
+
+
+def to_pixmap(image):
+    """
+    Return a QPixmap of a PIL image.
+    """
+    image = image.convert("RGBA")
+    data = image.tobytes("raw", "RGBA")
+    qimage = QImage(data, image.width, image.height, 4 * image.width,
+                    QImage.Format_RGBA8888)
+    # the QImage only borrows the bytes, the pixmap copies them
+    return QPixmap.fromImage(qimage)
+
+
+class IndexWorker(QThread):
+    """
+    Class to represent a thread that shows the indexed images of a folder,
+    then indexes the new and changed ones.
+    """
+    # file name, preview
+    preview_ready = pyqtSignal(str, object)
+    # indexed images, images that could not be read
+    scanned = pyqtSignal(int, int)
+
+    def __init__(self, index, pixel_size, num_colors, parent=None):
+        super().__init__(parent)
+        self.index = index
+        self.pixel_size = pixel_size
+        self.num_colors = num_colors
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def preview(self, name):
+        """
+        Return the preview of an image scaled up to the thumbnail size.
+        """
+        grid = self.index.preview(name, self.pixel_size, self.num_colors)
+        scale = max(1, THUMBNAIL_SIZE // max(grid.size))
+        return pixelation.upscale(grid, scale)
+
+    def run(self):
+        # what was indexed before shows up at once, without a file being read
+        for name in self.index.images():
+            if self._cancelled:
+                return
+            try:
+                self.preview_ready.emit(name, self.preview(name))
+            except OSError:
+                # the thumbnail was deleted meanwhile, the refresh makes it again
+                del self.index.entries[name]
+        for name, _ in self.index.refresh(cancelled=lambda: self._cancelled):
+            try:
+                self.preview_ready.emit(name, self.preview(name))
+            except OSError:
+                # the thumbnail was deleted meanwhile, the next refresh makes it again
+                del self.index.entries[name]
+        self.scanned.emit(self.index.indexed, self.index.failed)
+
+
+class ImageBrowser(QWidget):
+    """
+    Class to represent the image browser window.
+    """
+    # the path of the image to open
+    opened = pyqtSignal(str)
+
+    def __init__(self, image_editor, folder, parent=None):
+        super().__init__(parent, Qt.Window)
+        self.image_editor = image_editor
+        self.folder = folder
+        self.index = None
+        self.worker = None
+        self.items = {}
+        self.setWindowTitle("Images")
+        self.folder_label = QLabel(self)
+        self.folder_button = QPushButton("Folder...", self)
+        self.folder_button.clicked.connect(self.choose_folder)
+        self.status_label = QLabel(self)
+        self.list_widget = QListWidget(self)
+        self.list_widget.setViewMode(QListWidget.IconMode)
+        self.list_widget.setIconSize(QSize(THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        self.list_widget.setResizeMode(QListWidget.Adjust)
+        self.list_widget.setUniformItemSizes(True)
+        self.list_widget.itemActivated.connect(self._on_item_activated)
+        controls = QHBoxLayout()
+        controls.addWidget(self.folder_label, 1)
+        controls.addWidget(self.folder_button)
+        layout = QVBoxLayout(self)
+        layout.addLayout(controls)
+        layout.addWidget(self.list_widget)
+        layout.addWidget(self.status_label)
+        self.resize(6 * (THUMBNAIL_SIZE + 24), 4 * (THUMBNAIL_SIZE + 32))
+        # the indexing threads must not outlive the application
+        QApplication.instance().aboutToQuit.connect(self.stop)
+
+    def choose_folder(self):
+        folder = QFileDialog.getExistingDirectory(self, "Choose a folder", self.folder)
+        if folder:
+            self.show_folder(folder)
+
+    def show_folder(self, folder=None):
+        """
+        Show the images of a folder, from the index, and index it again.
+        """
+        self.stop()
+        self.folder = folder or self.folder
+        self.folder_label.setText(self.folder)
+        self.list_widget.clear()
+        self.items = {}
+        self.index = ThumbnailIndex(self.folder)
+        self.status_label.setText(f"{len(self.index.images())} images, scanning...")
+        self.worker = IndexWorker(self.index, self.image_editor.pixel_size,
+                                  self.image_editor.num_colors, self)
+        self.worker.preview_ready.connect(self._on_preview_ready)
+        self.worker.scanned.connect(self._on_scanned)
+        self.worker.start()
+
+    def _on_preview_ready(self, name, preview):
+        item = self.items.get(name)
+        if item is None:
+            item = QListWidgetItem(name)
+            item.setData(Qt.UserRole, name)
+            self.list_widget.addItem(item)
+            self.items[name] = item
+        entry = self.index.entries[name]
+        item.setIcon(QIcon(to_pixmap(preview)))
+        item.setToolTip(f"{name}\n{entry['size'][0]}x{entry['size'][1]} {entry['format']}")
+
+    def _on_scanned(self, indexed, failed):
+        # images deleted since the last scan are gone from the index
+        for name in [name for name in self.items if name not in self.index.entries]:
+            self.list_widget.takeItem(self.list_widget.row(self.items.pop(name)))
+        self.list_widget.sortItems()
+        self.status_label.setText(
+            f"{len(self.items)} images, {indexed} indexed"
+            + (f", {failed} unreadable" if failed else ""))
+
+    def _on_item_activated(self, item):
+        self.opened.emit(os.path.join(self.folder, item.data(Qt.UserRole)))
+
+    def stop(self):
+        """
+        Cancel a running scan and wait for it.
+        """
+        if self.worker is not None:
+            self.worker.cancel()
+            self.worker.wait()
+            self.worker = None
+
+    def closeEvent(self, event):
+        self.stop()
+        super().closeEvent(event)
@@ -0,0 +1,271 @@
+"""
+This module contains the layers of the image editor. Every layer is a compact
+grid with one byte per cell: the palette indices of its cells and how much of
+each cell it covers (alpha). The editor shows the flattened composite of the
+layers, which is kept in memory and recomposited only where a layer changed,
+so painting on a layer costs the same however many layers there are.
+
+There are three kinds of layers:
+    base   the pixelated source image, always the bottom layer
+    paint  the cells painted on it, drawn over the layers below
+    alpha  the transparency of the cells, for example from background removal
+
+A project file keeps the layers, the palette and the settings of the editor,
+so painting stays separate from the pixelation until the image is exported.
+"""
+
+import json
+import numpy as np
+from PIL import Image
+import pixelation
+from export import atomic_output
+
+LAYER_KINDS = ("base", "paint", "alpha")
+PROJECT_VERSION = 1
+PROJECT_SUFFIX = ".pixelart"
+
+
+class Layer:
+    """
+    Class to represent one layer: the palette indices of its cells (None for
+    an alpha layer) and its alpha (None for the base layer, which is opaque).
+    """
+
+    def __init__(self, name, kind, cells=None, alpha=None, visible=True):
+        if kind not in LAYER_KINDS:
+            raise ValueError(f"Unknown layer kind: {kind}")
+        self.name = name
+        self.kind = kind
+        self.cells = cells
+        self.alpha = alpha
+        self.visible = visible
+
+    @property
+    def shape(self):
+        return (self.cells if self.cells is not None else self.alpha).shape
+
+    def copy(self):
+        return Layer(self.name, self.kind,
+                     None if self.cells is None else self.cells.copy(),
+                     None if self.alpha is None else self.alpha.copy(),
+                     self.visible)
+
+    def resize(self, shape):
+        """
+        Scale the grids of the layer to a new number of rows and columns.
+        """
+        rows, cols = shape
+        if self.cells is not None:
+            self.cells = np.array(Image.fromarray(self.cells).resize(
+                (cols, rows), Image.NEAREST))
+        if self.alpha is not None:
+            self.alpha = np.array(Image.fromarray(self.alpha).resize(
+                (cols, rows), Image.NEAREST))
+
+
+class LayerStack:
+    """
+    Class to represent the layers of the editor, bottom first, and their
+    flattened composite.
+    """
+
+    def __init__(self, base_cells):
+        """
+        :param base_cells: The palette indices of the pixelated image.
+        """
+        self.layers = [Layer("Base", "base", base_cells)]
+        # the layer painting goes to
+        self.active = 0
+        # the composite: the index and the alpha of every cell as shown
+        self.cells = np.empty_like(base_cells)
+        self.alpha = np.empty_like(base_cells)
+        self.composite()
+
+    @property
+    def shape(self):
+        return self.cells.shape
+
+    @property
+    def base(self):
+        return self.layers[0]
+
+    @property
+    def active_layer(self):
+        return self.layers[self.active]
+
+    def add(self, name, kind, alpha=None):
+        """
+        Add an empty paint layer on top and make it active, or an alpha layer
+        right above the base, so paint stays visible over it.
+
+        :param alpha: The alpha of a new alpha layer, opaque by default.
+        :return: The position of the new layer.
+        """
+        if kind == "paint":
+            layer = Layer(name, kind, np.zeros(self.shape, dtype=np.uint8),
+                          np.zeros(self.shape, dtype=np.uint8))
+            self.layers.append(layer)
+            self.active = len(self.layers) - 1
+        elif kind == "alpha":
+            if alpha is None:
+                alpha = np.full(self.shape, 255, dtype=np.uint8)
+            layer = Layer(name, kind, alpha=alpha)
+            self.layers.insert(1, layer)
+            if self.active >= 1:
+                self.active += 1
+        else:
+            raise ValueError("A stack has a single base layer")
+        self.composite()
+        return self.layers.index(layer)
+
+    def remove(self, index):
+        """
+        Remove a layer other than the base.
+        """
+        if index == 0:
+            raise ValueError("The base layer cannot be removed")
+        del self.layers[index]
+        if self.active >= index:
+            self.active = max(0, self.active - 1)
+        self.composite()
+
+    def composite(self, top=0, left=0, bottom=None, right=None):
+        """
+        Flatten the layers into the composite, in rows top:bottom and columns
+        left:right only. The composite arrays are updated in place.
+        """
+        box = (slice(top, bottom), slice(left, right))
+        cells = self.cells[box]
+        alpha = self.alpha[box]
+        base = self.base
+        cells[...] = base.cells[box]
+        alpha[...] = 255 if base.visible else 0
+        for layer in self.layers[1:]:
+            if not layer.visible:
+                continue
+            if layer.kind == "paint":
+                covered = layer.alpha[box] > 0
+                cells[covered] = layer.cells[box][covered]
+                alpha[covered] = 255
+            else:
+                alpha[...] = (alpha.astype(np.uint16) * layer.alpha[box] // 255) \
+                    .astype(np.uint8)
+
+    def set_base(self, cells, lut=None):
+        """
+        Replace the base layer with a new pixelation. The other layers are
+        kept: scaled to the new grid, and their indices mapped with lut into
+        the new palette.
+        """
+        for layer in self.layers[1:]:
+            if layer.shape != cells.shape:
+                layer.resize(cells.shape)
+            if lut is not None and layer.cells is not None:
+                layer.cells = lut[layer.cells]
+        self.base.cells = cells
+        if self.cells.shape != cells.shape:
+            # a new array: the canvas wraps the composite again
+            self.cells = np.empty_like(cells)
+            self.alpha = np.empty_like(cells)
+        self.composite()
+
+    def used_indices(self, base=True):
+        """
+        Return the palette indices any layer uses, shown or not.
+
+        :param base: Whether to include the indices of the base layer.
+        """
+        used = np.zeros(256, dtype=bool)
+        for layer in self.layers if base else self.layers[1:]:
+            if layer.cells is None:
+                continue
+            cells = layer.cells if layer.kind == "base" else layer.cells[layer.alpha > 0]
+            used[np.unique(cells)] = True
+        return used
+
+    def is_opaque(self):
+        return bool((self.alpha == 255).all())
+
+    def copy(self):
+        """
+        Return a copy of the stack, for the history.
+        """
+        stack = LayerStack.__new__(LayerStack)
+        stack.layers = [layer.copy() for layer in self.layers]
+        stack.active = self.active
+        stack.cells = self.cells.copy()
+        stack.alpha = self.alpha.copy()
+        return stack
+
+
+def background_alpha(cells, palette, tolerance=20):
+    """
+    Return the alpha of a background removal: the cells connected to the
+    border whose color is close to the most common color of the border are
+    transparent, the others opaque.
+
+    :param cells: A 2D uint8 array of palette indices.
+    :param palette: The list of RGB colors the indices refer to.
+    :param tolerance: How far (per channel) a color may be from the background.
+    """
+    border = np.concatenate([cells[0], cells[-1], cells[:, 0], cells[:, -1]])
+    background = np.bincount(border).argmax()
+    colors = np.array(palette, dtype=np.int16)
+    similar = (np.abs(colors - colors[background]) <= tolerance).all(axis=1)
+    match = similar[cells]
+    removed = np.zeros(cells.shape, dtype=bool)
+    rows, cols = cells.shape
+    seeds = [(0, col) for col in range(cols)] + [(rows - 1, col) for col in range(cols)] \
+        + [(row, 0) for row in range(rows)] + [(row, cols - 1) for row in range(rows)]
+    for row, col in seeds:
+        if match[row, col] and not removed[row, col]:
+            removed |= pixelation.flood_fill(match, row, col)
+    return np.where(removed, 0, 255).astype(np.uint8)
+
+
+def write_project(path, stack, palette, settings):
+    """
+    Write a project file: the layers, the palette and the settings of the
+    editor. The file is replaced only once it is complete.
+
+    :param settings: A JSON serializable dict, such as the pixel size.
+    """
+    meta = {
+        "version": PROJECT_VERSION,
+        "settings": settings,
+        "palette": [list(color) for color in palette],
+        "active": stack.active,
+        "layers": [{"name": layer.name, "kind": layer.kind, "visible": layer.visible}
+                   for layer in stack.layers],
+    }
+    arrays = {"meta": np.array(json.dumps(meta))}
+    for position, layer in enumerate(stack.layers):
+        if layer.cells is not None:
+            arrays[f"cells{position}"] = layer.cells
+        if layer.alpha is not None:
+            arrays[f"alpha{position}"] = layer.alpha
+    with atomic_output(path) as temporary:
+        with open(temporary, "wb") as file:
+            np.savez_compressed(file, **arrays)
+
+
+def read_project(path):
+    """
+    Read a project file.
+
+    :return: The layer stack, the palette and the settings.
+    """
+    with np.load(path, allow_pickle=False) as data:
+        meta = json.loads(str(data["meta"]))
+        if meta["version"] > PROJECT_VERSION:
+            raise ValueError(f"{path} was saved by a newer version")
+        layers = [Layer(entry["name"], entry["kind"],
+                        data[f"cells{position}"] if f"cells{position}" in data else None,
+                        data[f"alpha{position}"] if f"alpha{position}" in data else None,
+                        entry["visible"])
+                  for position, entry in enumerate(meta["layers"])]
+    stack = LayerStack(layers[0].cells)
+    stack.layers = layers
+    stack.active = meta["active"]
+    stack.composite()
+    return stack, [tuple(color) for color in meta["palette"]], meta["settings"]
@@ -0,0 +1,100 @@
+"""
+This script sends concurrent requests to a running pixel_server.py instance
+and reports the latency and throughput it sees, followed by the server's own
+metrics.
+
+Usage:
+    python3 pixel_server.py --port 8765 &
+    python3 load_test.py images/Bruce.png --port 8765 --requests 200 --concurrency 16
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+
+
+async def request(host, port, method, path, body=b""):
+    """
+    Send one HTTP request and return the status code and the response body.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: {host}\r\n"
+        f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, payload = response.partition(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    return status, payload
+
+
+async def run(args):
+    """
+    Run the load test and print the report.
+    """
+    with open(args.image, "rb") as file:
+        image = file.read()
+    # a few distinct parameter sets, so that the run exercises computing,
+    # coalescing and caching
+    variants = [
+        f"/{operation}?pixel_size={pixel_size}&num_colors={num_colors}"
+        for operation in ("pixelate", "transparent")
+        for pixel_size in (4, 6, 8)
+        for num_colors in (4, 8)
+    ][:args.distinct]
+    queue = asyncio.Queue()
+    for _ in range(args.requests):
+        queue.put_nowait(random.choice(variants))
+    latencies = []
+    failures = 0
+
+    async def client():
+        nonlocal failures
+        while not queue.empty():
+            path = queue.get_nowait()
+            start = time.perf_counter()
+            try:
+                status, _ = await request(args.host, args.port, "POST", path, image)
+            except OSError:
+                status = 0
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                failures += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print(f"Requests: {len(latencies)}  failures: {failures}  "
+          f"concurrency: {args.concurrency}")
+    print(f"Throughput: {len(latencies) / elapsed:.1f} requests/s")
+    for name, fraction in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99)):
+        latency = latencies[min(len(latencies) - 1, int(fraction * len(latencies)))]
+        print(f"Latency {name}: {latency * 1000:.1f} ms")
+    _, metrics = await request(args.host, args.port, "GET", "/metrics")
+    print("Server metrics:")
+    print(json.dumps(json.loads(metrics), indent=2))
+
+
+def main(argv=None):
+    """
+    The command line entry point.
+    """
+    parser = argparse.ArgumentParser(description="Load test the pixelation service.")
+    parser.add_argument("image", help="The image sent with every request")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("-n", "--requests", type=int, default=200)
+    parser.add_argument("-c", "--concurrency", type=int, default=16)
+    parser.add_argument("-d", "--distinct", type=int, default=6,
+                        help="The number of distinct parameter sets used")
+    args = parser.parse_args(argv)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -7,15 +7,19 @@ import sys
 import os
 from pixel_editor import PixelEditor
 from board_gui import BoardGUI
-from custom_toolbar import CustomToolbar
+from custom_toolbar import CustomToolbar, FastToolbar
 from PyQt5.QtWidgets import QApplication
+import disk_cache
 
 
 if __name__ == "__main__":
     # check for a picture in the command line arguments
     IMAGE_PATH = None
-    if len(sys.argv) > 1:
-        IMAGE_PATH = sys.argv[1]
+    # --fast paints the board with QPainter instead of Matplotlib
+    FAST_CANVAS = "--fast" in sys.argv
+    args = [arg for arg in sys.argv[1:] if arg != "--fast"]
+    if args:
+        IMAGE_PATH = args[0]
     # check for .png files in the current directory
     if not IMAGE_PATH:
         for file in os.listdir("."):
@@ -27,8 +31,15 @@ if __name__ == "__main__":
         print("No image found - starting with a pop-up window.")
     app = QApplication(sys.argv)
     image_editor = PixelEditor(image_path=IMAGE_PATH)
-    main_window = BoardGUI(image_editor)
-    toolbar = CustomToolbar(main_window.canvas, main_window, main_window)
+    main_window = BoardGUI(image_editor, fast_canvas=FAST_CANVAS)
+    toolbar_class = FastToolbar if FAST_CANVAS else CustomToolbar
+    toolbar = toolbar_class(main_window.canvas, main_window, main_window)
     main_window.layout.addWidget(toolbar)
     main_window.show()
-    sys.exit(app.exec_())
+    status = app.exec_()
+    # how often a pixel size or color count change was served from the prefetch cache
+    print(f"Prefetch: {image_editor.prefetcher.stats()}")
+    cache = disk_cache.default_cache()
+    if cache is not None:
+        print(f"Cache: {cache.stats()}")
+    sys.exit(status)
@@ -0,0 +1,386 @@
+"""
+This module contains the PixelCanvas class, a light alternative to the
+Matplotlib figure of the BoardGUI class.
+
+The canvas wraps the logical grid of the image editor (one palette index per
+cell) in a QImage without copying it, and paints it with QPainter scaled by
+an integer factor, so a redraw costs about a millisecond instead of a full
+Matplotlib rasterization.
+
+The canvas is a viewport on the cells: it can be zoomed (mouse wheel) and
+panned (drag with the right or middle button). Only the visible cells are
+drawn, and zoomed out views are drawn from cached downsampled copies of the
+cells (mipmaps), so the cost of a redraw depends on the size of the widget,
+not on the size of the image.
+
+Transparent cells (from the alpha of the layers) are drawn over a
+checkerboard, as they are exported.
+"""
+
+import math
+import time
+import numpy as np
+from PyQt5 import sip
+from PyQt5.QtWidgets import QWidget, QSizePolicy, QApplication
+from PyQt5.QtGui import QImage, QPainter, QPixmap, QColor, QPen, qRgb
+from PyQt5.QtCore import Qt, QRect, QSize, pyqtSignal
+
+GRID_COLOR = QColor(0, 0, 0, 80)
+CHECKER_COLORS = (QColor(204, 204, 204), QColor(255, 255, 255))
+CHECKER_SIZE = 8
+# screen pixels per cell; levels below 1 are drawn from mipmaps
+ZOOM_LEVELS = (0.125, 0.25, 0.5, 1, 2, 3, 4, 6, 8, 12, 16, 24, 32, 48, 64)
+
+
+def wrap_indexed(cells):
+    """
+    Return an Indexed8 QImage sharing the memory of a 2D uint8 array.
+    """
+    height, width = cells.shape
+    return QImage(sip.voidptr(cells.ctypes.data), width, height,
+                  cells.strides[0], QImage.Format_Indexed8)
+
+
+def wrap_alpha(alpha):
+    """
+    Return an Alpha8 QImage sharing the memory of a 2D uint8 array.
+    """
+    height, width = alpha.shape
+    return QImage(sip.voidptr(alpha.ctypes.data), width, height,
+                  alpha.strides[0], QImage.Format_Alpha8)
+
+
+class PixelCanvas(QWidget):
+    """
+    Class to represent the QImage based canvas of the image editor.
+    """
+    cell_clicked = pyqtSignal(int, int)
+
+    def __init__(self, image_editor, parent=None):
+        super().__init__(parent)
+        self.image_editor = image_editor
+        self.qimage = None
+        self.show_grid = False
+        self.last_frame_ms = 0.0
+        # None fits the whole image at the largest integer scale
+        self.zoom = None
+        self.center = (0.0, 0.0)
+        self._cells = None
+        # the alpha of the composite, None while every cell is opaque
+        self._alpha = None
+        self._alpha_image = None
+        self._checker_tile = None
+        self._color_table = []
+        self._mipmaps = {}
+        self._grid_tile = None
+        self._grid_scale = None
+        self._drag_start = None
+        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+        self.setStyleSheet("background-color:transparent;")
+        self.wrap_cells()
+
+    def wrap_cells(self):
+        """
+        Wrap the cells of the image editor in a QImage. The QImage shares the
+        memory of the cells, so it is only created again when the editor
+        replaces the array (for example when the pixel size changes).
+        """
+        cells = self.image_editor.cells
+        if cells is not self._cells:
+            if self._cells is None or cells.shape != self._cells.shape:
+                self.zoom = None
+            self._cells = cells
+            self.qimage = wrap_indexed(cells)
+        self._color_table = [qRgb(*color) for color in self.image_editor.palette]
+        self.qimage.setColorTable(self._color_table)
+        layers = self.image_editor.layers
+        if layers.is_opaque():
+            self._alpha = self._alpha_image = None
+        elif layers.alpha is not self._alpha:
+            self._alpha = layers.alpha
+            self._alpha_image = wrap_alpha(layers.alpha)
+        # the downsampled views are out of date after any change
+        self._mipmaps = {}
+
+    def mipmap(self, factor):
+        """
+        Return a QImage of every factor-th cell and one of their alpha (None
+        while every cell is opaque), cached until the cells change.
+        """
+        if factor not in self._mipmaps:
+            cells = np.ascontiguousarray(self._cells[::factor, ::factor])
+            image = wrap_indexed(cells)
+            image.setColorTable(self._color_table)
+            alpha = alpha_image = None
+            if self._alpha is not None:
+                alpha = np.ascontiguousarray(self._alpha[::factor, ::factor])
+                alpha_image = wrap_alpha(alpha)
+            # keep the arrays alive as long as the QImages use their memory
+            self._mipmaps[factor] = (cells, image, alpha, alpha_image)
+        return self._mipmaps[factor][1], self._mipmaps[factor][3]
+
+    def checker_tile(self):
+        """
+        Return the tile of the checkerboard drawn under transparent cells.
+        """
+        if self._checker_tile is None:
+            tile = QPixmap(2 * CHECKER_SIZE, 2 * CHECKER_SIZE)
+            tile.fill(CHECKER_COLORS[0])
+            painter = QPainter(tile)
+            painter.fillRect(0, 0, CHECKER_SIZE, CHECKER_SIZE, CHECKER_COLORS[1])
+            painter.fillRect(CHECKER_SIZE, CHECKER_SIZE, CHECKER_SIZE, CHECKER_SIZE,
+                             CHECKER_COLORS[1])
+            painter.end()
+            self._checker_tile = tile
+        return self._checker_tile
+
+    @staticmethod
+    def apply_alpha(image, alpha, source):
+        """
+        Return the source rectangle of an indexed image with the alpha of the
+        cells applied, as a small ARGB image of one pixel per cell.
+        """
+        result = QImage(source.size(), QImage.Format_ARGB32_Premultiplied)
+        painter = QPainter(result)
+        painter.setCompositionMode(QPainter.CompositionMode_Source)
+        painter.drawImage(0, 0, image, source.x(), source.y(),
+                          source.width(), source.height())
+        painter.setCompositionMode(QPainter.CompositionMode_DestinationIn)
+        painter.drawImage(0, 0, alpha, source.x(), source.y(),
+                          source.width(), source.height())
+        painter.end()
+        return result
+
+    def draw_cells(self, painter, target, image, alpha, source):
+        """
+        Draw the source rectangle of the cells scaled to target, over a
+        checkerboard where the cells are transparent.
+        """
+        if alpha is None:
+            painter.drawImage(target, image, source)
+            return
+        painter.drawTiledPixmap(target, self.checker_tile())
+        painter.drawImage(target, self.apply_alpha(image, alpha, source))
+
+    def refresh(self, cell=None):
+        """
+        Repaint the canvas, or only the given (col, row) cell.
+        """
+        cells = self._cells
+        self.wrap_cells()
+        if cell is None or cells is not self._cells:
+            self.updateGeometry()
+            self.update()
+        else:
+            self.update(self.cell_rect(*cell))
+
+    def fit_scale(self):
+        """
+        Return the largest integer scale at which the cells fit the widget, or
+        the largest zoomed out level if the image is larger than the widget.
+        """
+        rows, cols = self._cells.shape
+        scale = min(self.width() / cols, self.height() / rows)
+        if scale >= 1:
+            return int(scale)
+        levels = [level for level in ZOOM_LEVELS if level <= scale]
+        return levels[-1] if levels else ZOOM_LEVELS[0]
+
+    def scale(self):
+        """
+        Return the current number of screen pixels per cell.
+        """
+        return self.zoom if self.zoom is not None else self.fit_scale()
+
+    def origin(self, scale):
+        """
+        Return the widget position of the top left corner of the cells.
+        """
+        rows, cols = self._cells.shape
+        if self.zoom is None:
+            return (round((self.width() - cols * scale) / 2),
+                    round((self.height() - rows * scale) / 2))
+        return (round(self.width() / 2 - self.center[0] * scale),
+                round(self.height() / 2 - self.center[1] * scale))
+
+    def visible_cells(self, scale, left, top):
+        """
+        Return the (first col, first row, last col, last row) range of visible cells.
+        """
+        rows, cols = self._cells.shape
+        first_col = max(0, math.floor(-left / scale))
+        first_row = max(0, math.floor(-top / scale))
+        last_col = min(cols, math.ceil((self.width() - left) / scale))
+        last_row = min(rows, math.ceil((self.height() - top) / scale))
+        return first_col, first_row, last_col, last_row
+
+    def cell_at(self, x, y):
+        """
+        Return the (col, row) cell under a widget position.
+        """
+        scale = self.scale()
+        left, top = self.origin(scale)
+        return math.floor((x - left) / scale), math.floor((y - top) / scale)
+
+    def cell_rect(self, col, row):
+        """
+        Return the widget rectangle covered by a cell.
+        """
+        scale = self.scale()
+        left, top = self.origin(scale)
+        size = max(1, math.ceil(scale))
+        return QRect(math.floor(left + col * scale), math.floor(top + row * scale),
+                     size, size)
+
+    def sizeHint(self):
+        rows, cols = self._cells.shape
+        pixel_size = self.image_editor.pixel_size
+        # never ask for more than the screen, however large the image is
+        screen = QApplication.primaryScreen().availableGeometry()
+        return QSize(min(cols * pixel_size, screen.width() * 4 // 5),
+                     min(rows * pixel_size, screen.height() * 4 // 5))
+
+    def set_grid_visible(self, visible):
+        """
+        Show or hide the pixel grid overlay.
+        """
+        self.show_grid = visible
+        self.update()
+
+    def set_zoom(self, zoom, anchor=None):
+        """
+        Zoom to the given scale, keeping the cell under anchor (a widget
+        position, by default the center of the widget) in place.
+        """
+        if anchor is None:
+            anchor = (self.width() / 2, self.height() / 2)
+        scale = self.scale()
+        left, top = self.origin(scale)
+        anchor_col = (anchor[0] - left) / scale
+        anchor_row = (anchor[1] - top) / scale
+        self.zoom = zoom
+        self.center = (anchor_col - (anchor[0] - self.width() / 2) / zoom,
+                       anchor_row - (anchor[1] - self.height() / 2) / zoom)
+        self.clamp_center()
+        self.update()
+
+    def zoom_by(self, steps, anchor=None):
+        """
+        Move the given number of zoom levels in or out.
+        """
+        scale = self.scale()
+        level = min(range(len(ZOOM_LEVELS)),
+                    key=lambda index: abs(ZOOM_LEVELS[index] - scale))
+        level = max(0, min(len(ZOOM_LEVELS) - 1, level + steps))
+        self.set_zoom(ZOOM_LEVELS[level], anchor)
+
+    def zoom_fit(self):
+        """
+        Show the whole image again.
+        """
+        self.zoom = None
+        self.update()
+
+    def pan_by(self, dx, dy):
+        """
+        Move the view by the given number of screen pixels.
+        """
+        if self.zoom is None:
+            # start panning from the fitted view
+            scale = self.fit_scale()
+            left, top = self.origin(scale)
+            self.zoom = scale
+            self.center = ((self.width() / 2 - left) / scale,
+                           (self.height() / 2 - top) / scale)
+        self.center = (self.center[0] - dx / self.zoom,
+                       self.center[1] - dy / self.zoom)
+        self.clamp_center()
+        self.update()
+
+    def clamp_center(self):
+        """
+        Keep the center of the view inside the image.
+        """
+        rows, cols = self._cells.shape
+        self.center = (min(max(self.center[0], 0), cols),
+                       min(max(self.center[1], 0), rows))
+
+    def grid_tile(self, scale):
+        """
+        Return one cell of the grid overlay: a transparent tile with a line on
+        its top and left edges. It is built once per scale and tiled over the
+        image, so drawing the grid costs the same for any number of cells.
+        """
+        if self._grid_scale != scale:
+            tile = QPixmap(scale, scale)
+            tile.fill(Qt.transparent)
+            painter = QPainter(tile)
+            painter.setPen(QPen(GRID_COLOR, 0))
+            painter.drawLine(0, 0, scale - 1, 0)
+            painter.drawLine(0, 0, 0, scale - 1)
+            painter.end()
+            self._grid_tile = tile
+            self._grid_scale = scale
+        return self._grid_tile
+
+    def paintEvent(self, event):
+        start = time.perf_counter()
+        scale = self.scale()
+        left, top = self.origin(scale)
+        first_col, first_row, last_col, last_row = self.visible_cells(scale, left, top)
+        if first_col >= last_col or first_row >= last_row:
+            return
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.SmoothPixmapTransform, False)
+        if scale >= 1:
+            # only the visible cells are scaled and drawn
+            target = QRect(left + first_col * scale, top + first_row * scale,
+                           (last_col - first_col) * scale,
+                           (last_row - first_row) * scale)
+            self.draw_cells(painter, target, self.qimage, self._alpha_image, QRect(
+                first_col, first_row, last_col - first_col, last_row - first_row))
+        else:
+            # zoomed out: one mipmap pixel per screen pixel
+            factor = round(1 / scale)
+            image, alpha = self.mipmap(factor)
+            source = QRect(first_col // factor, first_row // factor,
+                           math.ceil(last_col / factor) - first_col // factor,
+                           math.ceil(last_row / factor) - first_row // factor)
+            target = QRect(left + source.x(), top + source.y(),
+                           source.width(), source.height())
+            self.draw_cells(painter, target, image, alpha, source)
+        if self.show_grid and scale > 2:
+            painter.drawTiledPixmap(target, self.grid_tile(scale))
+            # close the grid on the right and bottom edges
+            painter.setPen(QPen(GRID_COLOR, 0))
+            painter.drawLine(target.right() + 1, target.top(),
+                             target.right() + 1, target.bottom() + 1)
+            painter.drawLine(target.left(), target.bottom() + 1,
+                             target.right() + 1, target.bottom() + 1)
+        painter.end()
+        self.last_frame_ms = (time.perf_counter() - start) * 1000
+
+    def mousePressEvent(self, event):
+        if event.button() in (Qt.RightButton, Qt.MiddleButton):
+            self._drag_start = event.pos()
+            return
+        if event.button() != Qt.LeftButton:
+            return
+        col, row = self.cell_at(event.x(), event.y())
+        rows, cols = self._cells.shape
+        if 0 <= col < cols and 0 <= row < rows:
+            self.cell_clicked.emit(col, row)
+
+    def mouseMoveEvent(self, event):
+        if self._drag_start is not None:
+            delta = event.pos() - self._drag_start
+            self._drag_start = event.pos()
+            self.pan_by(delta.x(), delta.y())
+
+    def mouseReleaseEvent(self, event):
+        if event.button() in (Qt.RightButton, Qt.MiddleButton):
+            self._drag_start = None
+
+    def wheelEvent(self, event):
+        steps = 1 if event.angleDelta().y() > 0 else -1
+        self.zoom_by(steps, (event.pos().x(), event.pos().y()))
@@ -11,8 +11,16 @@ from datetime import datetime
 import tkinter as tk
 from tkinter import filedialog
 from PIL import Image, UnidentifiedImageError
+import numpy as np
 import os
 from PyQt5.QtWidgets import QFileDialog
+import pixelation
+from prefetch import Prefetcher
+from color_usage import ColorUsage
+import export
+import disk_cache
+from layers import LayerStack, PROJECT_SUFFIX, background_alpha, read_project, \
+    write_project
 
 
 def save_history_before_action(method):
@@ -21,25 +29,114 @@ def save_history_before_action(method):
     """
 
     def wrapper(self, *args, **kwargs):
-        if len(self.history) > 10:
-            self.history.pop(0)
         self.save_to_history()  # Save current state before action
         return method(self, *args, **kwargs)
 
     return wrapper
 
 
+class CellEdit:
+    """
+    History entry for an edit of some cells of a layer: it keeps only the
+    colors and alpha the cells had on the layer inside the bounding box of the
+    edit, instead of a copy of the whole image.
+    """
+
+    def __init__(self, position, layer, palette, mask):
+        rows, cols = np.nonzero(mask)
+        self.top, self.left = rows.min(), cols.min()
+        self.bottom, self.right = rows.max() + 1, cols.max() + 1
+        self.mask = mask[self.top:self.bottom, self.left:self.right].copy()
+        self.position = position
+        box = (slice(self.top, self.bottom), slice(self.left, self.right))
+        self.old_cells = None if layer.cells is None else layer.cells[box][self.mask]
+        self.old_alpha = None if layer.alpha is None else layer.alpha[box][self.mask]
+        self.palette = list(palette)
+
+    def undo(self, editor):
+        """
+        Restore the cells of the layer, and the composite around them.
+        """
+        layer = editor.layers.layers[self.position]
+        box = (slice(self.top, self.bottom), slice(self.left, self.right))
+        if self.old_cells is not None:
+            # the palette may have changed since the edit, so map the colors again
+            lut = np.array([editor.palette_index(color) for color in self.palette],
+                           dtype=np.uint8)
+            layer.cells[box][self.mask] = lut[self.old_cells]
+        if self.old_alpha is not None:
+            layer.alpha[box][self.mask] = self.old_alpha
+        editor.recomposite(self.top, self.left, self.bottom, self.right)
+
+
+class PaletteEdit:
+    """
+    History entry for an edit of the palette: it keeps the previous palette,
+    which is all that is needed to undo a recolor.
+    """
+
+    def __init__(self, editor):
+        self.palette = list(editor.palette)
+        self.color_palette = list(editor.color_palette)
+        self.paint_color = editor.paint_color
+
+    def undo(self, editor):
+        """
+        Restore the palette of the editor.
+        """
+        editor.usage.mark_colors(*editor.palette, *self.palette)
+        editor.palette = self.palette
+        editor.color_palette = self.color_palette
+        editor.paint_color = self.paint_color
+        editor.sync_palette()
+
+
+class LayerEdit:
+    """
+    History entry for a change of the layers themselves (added, removed,
+    hidden): it keeps a copy of the layer grids, which are one byte per cell.
+    """
+
+    def __init__(self, editor):
+        self.layers = editor.layers.copy()
+        self.palette = list(editor.palette)
+        self.color_palette = list(editor.color_palette)
+        self.paint_color = editor.paint_color
+
+    def undo(self, editor):
+        """
+        Restore the layers of the editor.
+        """
+        editor.restore_layers(self.layers, self.palette)
+        editor.color_palette = self.color_palette
+        editor.paint_color = self.paint_color
+        editor.sync_palette()
+        editor.render_cells(0, 0, *editor.cells.shape)
+
+
 class PixelEditor:
     """
     Class to represent the image editor.
     """
 
-    def __init__(self, image_path=None, pixel_size=6, num_colors=4):
+    def __init__(self, image_path=None, pixel_size=6, num_colors=4, kernel="nearest",
+                 prefetch_depth=1, prefetch_bytes=64 * 1024 * 1024):
         self.pixel_size = pixel_size
         self.num_colors = num_colors
+        # how a block of the source image becomes a cell, see pixelation.KERNELS
+        self.kernel = kernel
+        # the states next to the current one are computed in the background
+        self.prefetcher = Prefetcher(prefetch_depth, prefetch_bytes)
         self.image_path = image_path if image_path else self.load_image(
             init=True)
         self.original_image = None
+        self.cells = None
+        self.palette = []
+        # the base pixelation, the paint and alpha layers, and their composite
+        self.layers = None
+        self.load_path = None
+        # how many cells use every palette index, kept up to date by every edit
+        self.usage = ColorUsage()
         try:
             self.image = Image.open(self.image_path)
         except FileNotFoundError:
@@ -47,9 +144,9 @@ class PixelEditor:
         except UnidentifiedImageError:
             print("Invalid image format")
             raise UnidentifiedImageError("Invalid image format")
+        self.image = self.pixelate_image(self.image_path, pixel_size)
         self.color_palette = self.calculate_new_palette(
             self.num_colors, self.original_image)
-        self.image = self.pixelate_image(self.image_path, pixel_size)
         self.history = []
         self.paint_color = self.color_palette[0]
 
@@ -60,6 +157,7 @@ class PixelEditor:
         temp = self.image
         self.image = self.original_image
         self.original_image = temp
+        self.refresh_grid()
         self.history = []
 
     @save_history_before_action
@@ -96,20 +194,41 @@ class PixelEditor:
             raise FileNotFoundError("No file selected")
         if init:
             return file_path
+        self.open_image(file_path)
+
+    def open_image(self, file_path):
+        """
+        Open another image, with new layers and an empty history. The image
+        is only decoded as far as its grid needs, see pixelation.load.
+        """
         self.image_path = file_path
         self.original_image = Image.open(self.image_path)
+        # the layers of the previous image do not apply to this one
+        self.layers = None
         self.image = self.pixelate_image(self.image_path, self.pixel_size)
         self.color_palette = self.calculate_new_palette(self.num_colors)
+        if self.paint_color not in self.color_palette and self.color_palette:
+            self.paint_color = self.color_palette[0]
         self.history = []
 
     def save_to_history(self):
         """
         Save the current state of the image to the history.
         """
-        self.history.append(
-            [copy.deepcopy(self.image), self.pixel_size, self.num_colors]
+        self._push_history(
+            [copy.deepcopy(self.image), self.pixel_size, self.num_colors,
+             self.layers.copy(), list(self.palette), self.kernel,
+             list(self.color_palette), self.paint_color]
         )
 
+    def _push_history(self, entry):
+        """
+        Add an entry to the history, dropping the oldest one past the limit.
+        """
+        if len(self.history) > 10:
+            self.history.pop(0)
+        self.history.append(entry)
+
     def pixelate_image(self, image_path=None, pixel_size=None):
         """
         Pixelate the image.
@@ -117,20 +236,106 @@ class PixelEditor:
         pixel_size = pixel_size if pixel_size else self.pixel_size + 1
         if not image_path:
             image_path = self.image_path
-        image = Image.open(image_path)
-        image = image.resize(
-            (image.size[0] // pixel_size,
-             image.size[1] // pixel_size), Image.NEAREST
-        )
-        if self.num_colors:
-            image = image.convert(
-                "P", palette=Image.ADAPTIVE, colors=self.num_colors, dither=Image.FLOYDSTEINBERG
-            )
+        key = (image_path, pixel_size, self.num_colors, self.kernel)
+        image = self.prefetcher.get(key)
+        if image is None:
+            # from the cache of earlier sessions, or computed and stored there
+            image = disk_cache.pixelate_file(image_path, pixel_size,
+                                             self.num_colors, kernel=self.kernel)
+            self.prefetcher.put(key, image)
+        # how the source of the grid was decoded, see pixelation.load
+        self.load_path = image.info.get("load", "full")
+        self.prefetcher.prefetch(key)
         self.pixel_size = pixel_size
-        return image.resize(
-            (image.size[0] * pixel_size, image.size[1]
-             * pixel_size), Image.NEAREST
-        )
+        return pixelation.upscale(self.set_grid(image), pixel_size)
+
+    def set_grid(self, grid):
+        """
+        Make a new pixelation the base layer, as an array of palette indices,
+        one per cell, and return the composite of the layers as a "P" mode
+        image. The paint layers are kept, and keep their colors.
+        """
+        if grid.mode != "P":
+            # without color quantization, index up to 256 colors of the cells
+            grid = grid.convert("RGB").quantize(256, dither=Image.NONE)
+        cells = np.array(grid, dtype=np.uint8)
+        old_palette = self.palette
+        self.usage.mark_colors(*old_palette)
+        self.palette = pixelation.palette_colors(grid)
+        if self.layers is None:
+            self.layers = LayerStack(cells)
+            # painting goes to a layer of its own, over the pixelation
+            self.layers.add("Paint 1", "paint")
+        else:
+            lut = np.zeros(256, dtype=np.uint8)
+            for index in np.flatnonzero(self.layers.used_indices(base=False)):
+                if index < len(old_palette):
+                    lut[index] = self._grid_index(old_palette[index])
+            self.layers.set_base(cells, lut)
+        self.cells = self.layers.cells
+        self.usage.rebuild(self.cells)
+        self.usage.mark_colors(*self.palette)
+        return self.grid_image()
+
+    def _grid_index(self, color):
+        """
+        Return the index of a painted color in a new palette, adding it if needed.
+        """
+        if color in self.palette:
+            return self.palette.index(color)
+        if len(self.palette) < 256:
+            self.palette.append(color)
+            return len(self.palette) - 1
+        distances = np.abs(np.array(self.palette) - color).sum(axis=1)
+        return int(distances.argmin())
+
+    def grid_image(self):
+        """
+        Return the composite cells as a "P" mode image with the palette of the cells.
+        """
+        grid = Image.fromarray(self.cells, "P")
+        grid.putpalette([channel for color in self.palette for channel in color])
+        return grid
+
+    def sync_palette(self):
+        """
+        Give the image the palette of the cells. A "P" mode image shares its
+        indices with the cells, so this recolors it without touching any pixel.
+        """
+        if self.image is not None and self.image.mode == "P":
+            self.image.putpalette(
+                [channel for color in self.palette for channel in color])
+
+    def refresh_grid(self):
+        """
+        Rebuild the logical grid from the image, after it was replaced as a whole.
+        """
+        if self.image is not None:
+            self.set_grid(pixelation.downscale(self.image, self.pixel_size))
+
+    def palette_index(self, color):
+        """
+        Return the index of the color in the palette of the cells, adding it if needed.
+        """
+        color = tuple(color[:3])
+        if color in self.palette:
+            return self.palette.index(color)
+        if len(self.palette) < 256:
+            self.palette.append(color)
+            self.sync_palette()
+            return len(self.palette) - 1
+        # an entry no cell shows may still be used by a hidden or covered layer
+        used = self.layers.used_indices()
+        unused = [index for index in self.usage.unused(self.palette) if not used[index]]
+        if unused:
+            # the palette is full: reuse an entry no cell shows
+            self.usage.mark_colors(self.palette[unused[0]], color)
+            self.palette[unused[0]] = color
+            self.sync_palette()
+            return unused[0]
+        # the palette is full: use the closest color
+        distances = np.abs(np.array(self.palette) - color).sum(axis=1)
+        return int(distances.argmin())
 
     def save_image(self, file_name=None):
         """
@@ -143,42 +348,218 @@ class PixelEditor:
         # self.image = self.image.resize(
         #     (self.image.width // self.pixel_size, self.image.height // self.pixel_size)
         # )
-        self.image.save(file_name, "PNG")
+        export.ExportJob(self.snapshot(), "png", file_name).run()
 
     def save_transparent_png(self, event=None, file_name=None):
         """
         Save the image as a transparent png file.
         """
-        image = self.image.convert("RGBA")
-        new_data = []
-        brightest_color = self.color_palette[0]
-        for item in image.getdata():
-            if all(abs(item[i] - brightest_color[i]) < 20 for i in range(3)):
-                new_data.append((255, 255, 255, 0))
-            else:
-                new_data.append(item)
-        image.putdata(new_data)
         if file_name is None:
             file_name = datetime.now().strftime("%Y%m%d%H%M%S") + ".png"
         else:
             # check if has .png extension
             if file_name[-4:] != ".png":
                 file_name += ".png"
-        image.save(file_name, "PNG")
+        export.ExportJob(self.snapshot(), "transparent", file_name).run()
+
+    def snapshot(self):
+        """
+        Return a copy of the state an export needs, so the export can run in
+        the background while the editor keeps changing.
+        """
+        return export.EditorSnapshot(
+            image=self.image.copy(),
+            cells=self.cells.copy(),
+            palette=tuple(self.palette),
+            counts=self.usage.counts.copy(),
+            pixel_size=self.pixel_size,
+            num_colors=self.num_colors,
+            kernel=self.kernel,
+            image_path=self.image_path,
+            # the transparent export removes the brightest color
+            transparent_color=max(self.color_palette, key=sum, default=(255, 255, 255)),
+            alpha=None if self.layers.is_opaque() else self.layers.alpha.copy(),
+        )
+
+    def export_indexed(self, file_name, scales=(1,), optimize=False,
+                       compress_level=9, transparent=None):
+        """
+        Save the logical grid as indexed PNG files at the smallest bit depth
+        that fits its colors, one file per scale, see export.export_grid.
+
+        :return: The size and time report of every file.
+        """
+        if not file_name.lower().endswith(".png"):
+            file_name += ".png"
+        report = export.export_grid(
+            self.cells, self.palette, file_name, scales, optimize,
+            compress_level, transparent, counts=self.usage.counts,
+            alpha=None if self.layers.is_opaque() else self.layers.alpha)
+        export.print_report(report)
+        return report
 
-    @save_history_before_action
     def paint_pixel(self, x, y):
         """
         Paint the pixel at the given coordinates.
         """
-        for i in range(x, min(x + self.pixel_size, self.image.width)):
-            for j in range(y, min(y + self.pixel_size, self.image.height)):
-                self.image.putpixel((i, j), self.paint_color)
+        row, col = y // self.pixel_size, x // self.pixel_size
+        if not (0 <= row < self.cells.shape[0] and 0 <= col < self.cells.shape[1]):
+            return
+        mask = np.zeros(self.cells.shape, dtype=bool)
+        mask[row, col] = True
+        self.edit_cells(mask, self.palette_index(self.paint_color))
+
+    def edit_cells(self, mask, index):
+        """
+        Paint the cells of the mask with a palette index on the active layer,
+        as one undo step. On an alpha layer, painting makes the cells opaque.
+        """
+        layer = self.layers.active_layer
+        edit = CellEdit(self.layers.active, layer, self.palette, mask)
+        self._push_history(edit)
+        if layer.cells is not None:
+            layer.cells[mask] = index
+        if layer.alpha is not None:
+            layer.alpha[mask] = 255
+        self.recomposite(edit.top, edit.left, edit.bottom, edit.right)
+
+    def recomposite(self, top, left, bottom, right):
+        """
+        Flatten the layers again in rows top:bottom and columns left:right
+        only, and draw the cells that changed.
+        """
+        old_cells = self.cells[top:bottom, left:right].copy()
+        self.layers.composite(top, left, bottom, right)
+        self.usage.update(old_cells, self.cells[top:bottom, left:right])
+        self.render_cells(top, left, bottom, right)
+
+    def render_cells(self, top, left, bottom, right):
+        """
+        Draw the cells in rows top:bottom and columns left:right on the image.
+        """
+        region = self.cells[top:bottom, left:right]
+        if self.image.mode == "P":
+            # the image shares the palette of the cells
+            indices = np.ascontiguousarray(region)
+            block = Image.frombytes("P", indices.shape[::-1], indices.tobytes())
+        else:
+            block = Image.fromarray(
+                np.array(self.palette, dtype=np.uint8)[region], "RGB").convert(
+                    self.image.mode)
+        self.image.paste(pixelation.upscale(block, self.pixel_size),
+                         (left * self.pixel_size, top * self.pixel_size))
+
+    def flood_fill(self, x, y, connectivity=4, tolerance=0):
+        """
+        Fill the region of similar cells around the given coordinates with the
+        paint color. The fill is one undo step that only records the filled cells.
+
+        :param x: The x coordinate on the image.
+        :param y: The y coordinate on the image.
+        :param connectivity: 4 or 8 connected cells.
+        :param tolerance: How far (per channel) a color may be from the color
+            of the clicked cell to be filled.
+        :return: The number of cells filled.
+        """
+        row, col = y // self.pixel_size, x // self.pixel_size
+        if not (0 <= row < self.cells.shape[0] and 0 <= col < self.cells.shape[1]):
+            return 0
+        index = self.palette_index(self.paint_color)
+        # decide once per palette entry which colors match the clicked cell
+        palette = np.array(self.palette, dtype=np.int16)
+        similar = (np.abs(palette - palette[self.cells[row, col]])
+                   <= tolerance).all(axis=1)
+        filled = pixelation.flood_fill(similar[self.cells], row, col, connectivity)
+        filled &= self.cells != index
+        if not filled.any():
+            return 0
+        self.edit_cells(filled, index)
+        return int(filled.sum())
+
+    def _edit_palette(self, old_color, new_color):
+        """
+        Record the palette for undo and update the colors shown in the toolbar.
+        """
+        self._push_history(PaletteEdit(self))
+        old_color, new_color = tuple(old_color[:3]), tuple(new_color[:3])
+        self.color_palette = list(dict.fromkeys(
+            new_color if color == old_color else color for color in self.color_palette))
+        if self.paint_color == old_color:
+            self.paint_color = new_color
+
+    def replace_palette_color(self, index, color):
+        """
+        Show every cell using the palette entry with a new color. Only the
+        palette table changes: no pixel is visited and nothing is quantized
+        again, so painted cells are kept. The entries merged with this one
+        share its color and are recolored with it, and a color another entry
+        already has merges the two colors.
+        """
+        old_color, color = self.palette[index], tuple(color[:3])
+        if color == old_color:
+            return
+        self._edit_palette(old_color, color)
+        self.usage.mark_colors(old_color, color)
+        for position, entry in enumerate(self.palette):
+            if entry == old_color:
+                self.palette[position] = color
+        self.sync_palette()
+
+    def merge_palette_colors(self, source, target):
+        """
+        Merge the source palette entry into the target entry: the source entry
+        takes the color of the target, and the two are recolored together from
+        then on. Like a recolor, only the palette table changes. One undo step.
+        """
+        self.replace_palette_color(source, self.palette[target])
+
+    def swap_palette_colors(self, first, second):
+        """
+        Swap the colors of two palette entries, and of the entries merged with them.
+        """
+        first_color, second_color = self.palette[first], self.palette[second]
+        if first_color == second_color:
+            return
+        self._push_history(PaletteEdit(self))
+        swap = {first_color: second_color, second_color: first_color}
+        self.palette[:] = [swap.get(entry, entry) for entry in self.palette]
+        self.usage.mark_colors(first_color, second_color)
+        self.sync_palette()
+
+    def color_usage(self, color):
+        """
+        Return the number of cells shown with the color.
+        """
+        return self.usage.count(self.palette, color)
+
+    def remove_unused_colors(self):
+        """
+        Remove the colors no cell uses from the color palette. The usage counts
+        are kept up to date by every edit, so nothing is scanned.
+
+        :return: The number of colors removed.
+        """
+        used = {self.palette[index] for index in self.usage.used()
+                if index < len(self.palette)}
+        unused = [color for color in self.color_palette if color not in used]
+        if not unused:
+            return 0
+        self._push_history(PaletteEdit(self))
+        self.color_palette = [color for color in self.color_palette if color in used]
+        if self.paint_color not in used and self.color_palette:
+            self.paint_color = self.color_palette[0]
+        return len(unused)
 
     def calculate_new_palette(self, new_num_colors, image=None):
         """
         Calculate the new color palette when the number of colors is changed.
         """
+        if not image and self.cells is not None:
+            # the colors the cells use, known from the usage counts without
+            # quantizing the image again
+            return list(dict.fromkeys(
+                self.palette[index] for index in self.usage.used()
+                if index < len(self.palette)))
         if not image:
             image = self.image
         # Calculate the new palette
@@ -199,6 +580,17 @@ class PixelEditor:
         print(new_num_colors)
         return new_palette
 
+    @save_history_before_action
+    def change_kernel(self, kernel):
+        """
+        Change how the blocks of the source image become cells.
+        """
+        if kernel not in pixelation.KERNELS:
+            raise ValueError(f"Unknown kernel: {kernel}")
+        self.kernel = kernel
+        self.image = self.pixelate_image(self.image_path, self.pixel_size)
+        self.color_palette = self.calculate_new_palette(self.num_colors)
+
     @save_history_before_action
     def change_pixel_size(self, pixel_size):
         """
@@ -208,46 +600,139 @@ class PixelEditor:
         self.image = self.pixelate_image(self.image_path, self.pixel_size)
         self.color_palette = self.calculate_new_palette(self.num_colors)
 
-    def undo(self):
+    @save_history_before_action
+    def apply_settings(self, pixel_size, num_colors):
         """
-        Undo the last action.
+        Change the pixel size and the number of colors in one step, as chosen
+        on the contact sheet.
         """
-        if len(self.history) > 0:
-            self.image, self.pixel_size, self.num_colors = self.history.pop()
+        self.num_colors = int(num_colors)
+        self.image = self.pixelate_image(self.image_path, int(pixel_size))
+        self.color_palette = self.calculate_new_palette(self.num_colors)
 
-    def make_gif(self, file_name, frames=19):
+    def restore_layers(self, stack, palette):
         """
-        Create a gif of the image by changing the pixel size,
-        and saving the image at each step, then combining the images into a gif.
+        Replace the layers and the palette of the cells, for undo and projects.
         """
+        self.usage.mark_colors(*self.palette)
+        self.layers = stack
+        self.palette = list(palette)
+        self.cells = stack.cells
+        self.usage.rebuild(self.cells)
+        self.usage.mark_colors(*self.palette)
 
-        for i in range(frames):
-            # Save the current state of the GUI as an image
-            self.image.save("temp" + str(i) + ".png")
-            self.change_pixel_size(self.pixel_size + 1)
+    def _edit_layers(self):
+        """
+        Record the layers for undo, before they change.
+        """
+        self._push_history(LayerEdit(self))
+
+    def _layers_changed(self):
+        """
+        Show the composite after the layers changed as a whole.
+        """
+        self.usage.rebuild(self.cells)
+        self.render_cells(0, 0, *self.cells.shape)
 
-        # create a gif from the saved images than delete them
-        images_forward = []
-        images_reverse = []
-        for i in range(frames):
-            image = Image.open("temp" + str(i) + ".png")
-            images_forward.append(image)
-            # Add to the start of the list for reverse sequence
-            images_reverse.insert(0, image.copy())
+    def add_paint_layer(self):
+        """
+        Add an empty paint layer on top, and paint on it.
+        """
+        self._edit_layers()
+        count = sum(layer.kind == "paint" for layer in self.layers.layers)
+        self.layers.add(f"Paint {count + 1}", "paint")
 
-        # Create a longer pause in the GIF at the most pixelated image
-        # Increase this number for a longer pause
-        pause_images = [images_forward[-1]] * 5
+    def remove_background(self, tolerance=20):
+        """
+        Add an alpha layer that makes the background transparent: the cells
+        connected to the border with about the color of the border. The
+        cells keep their colors, the alpha is applied when exporting.
+
+        :return: The number of transparent cells.
+        """
+        alpha = background_alpha(self.cells, self.palette, tolerance)
+        self._edit_layers()
+        self.layers.add("Background removal", "alpha", alpha)
+        return int((alpha == 0).sum())
+
+    def remove_layer(self, position):
+        """
+        Remove a layer other than the base.
+        """
+        self._edit_layers()
+        self.layers.remove(position)
+        self._layers_changed()
+
+    def set_layer_visible(self, position, visible):
+        """
+        Show or hide a layer.
+        """
+        self._edit_layers()
+        self.layers.layers[position].visible = visible
+        self.layers.composite()
+        self._layers_changed()
+
+    def set_active_layer(self, position):
+        """
+        Choose the layer painting goes to.
+        """
+        self.layers.active = position
 
-        # Combine forward sequence, pause, and reverse sequence
-        images = images_forward + pause_images
+    def save_project(self, file_name):
+        """
+        Save the layers and settings in a project file, to continue editing later.
+        """
+        if not file_name.endswith(PROJECT_SUFFIX):
+            file_name += PROJECT_SUFFIX
+        write_project(file_name, self.layers, self.palette, {
+            "image_path": self.image_path,
+            "pixel_size": self.pixel_size,
+            "num_colors": self.num_colors,
+            "kernel": self.kernel,
+        })
+        print(f"Project saved to {file_name}")
+        return file_name
+
+    def open_project(self, file_name):
+        """
+        Open a project file saved by save_project.
+        """
+        stack, palette, settings = read_project(file_name)
+        self.image_path = settings["image_path"]
+        self.pixel_size = settings["pixel_size"]
+        self.num_colors = settings["num_colors"]
+        self.kernel = settings["kernel"]
+        self.restore_layers(stack, palette)
+        self.image = pixelation.upscale(self.grid_image(), self.pixel_size)
+        if os.path.isfile(self.image_path):
+            self.original_image = Image.open(self.image_path)
+        self.color_palette = self.calculate_new_palette(self.num_colors)
+        if self.paint_color not in self.color_palette and self.color_palette:
+            self.paint_color = self.color_palette[0]
+        self.history = []
+
+    def undo(self):
+        """
+        Undo the last action.
+        """
+        if len(self.history) > 0:
+            entry = self.history.pop()
+            if not isinstance(entry, list):
+                # a CellEdit or a PaletteEdit knows how to undo itself
+                entry.undo(self)
+                return
+            (self.image, self.pixel_size, self.num_colors, stack, palette,
+             self.kernel, self.color_palette, self.paint_color) = entry
+            self.restore_layers(stack, palette)
+
+    def make_gif(self, file_name, frames=19):
+        """
+        Create a gif of the image by changing the pixel size, one step per
+        frame, and save it in the gifs directory.
+        """
         # check for gif directory
         if not os.path.exists("gifs"):
             os.makedirs("gifs")
         file_name = "gifs/" + file_name
-        images[0].save(file_name, save_all=True,
-                       append_images=images[1:], duration=100, loop=0)
-        for i in range(frames):
-            os.remove("temp" + str(i) + ".png")
-
+        export.ExportJob(self.snapshot(), "gif", file_name, frames=frames).run()
         print("GIF created")
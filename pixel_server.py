@@ -0,0 +1,311 @@
+"""
+This module runs a small local HTTP service on top of the pixelation core,
+so other tools can pixelate images without starting Python for every image.
+
+Endpoints (the image is the raw request body, the result is a PNG):
+    POST /pixelate?pixel_size=6&num_colors=4[&kernel=mode]
+    POST /quantize?num_colors=4
+    POST /transparent?pixel_size=6&num_colors=4&tolerance=20[&color=ffffff]
+    GET  /metrics    latency, throughput and cache statistics as JSON
+    GET  /health
+
+The image work runs on a process pool. Identical concurrent requests (same
+image content and parameters) are computed once, results are kept in an LRU
+keyed by the content hash, and every worker keeps its recently decoded
+sources in an LRU of its own.
+
+Usage:
+    python3 pixel_server.py --port 8765
+"""
+
+import argparse
+import asyncio
+import hashlib
+import io
+import json
+import multiprocessing
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit, parse_qsl
+from PIL import Image, UnidentifiedImageError
+import pixelation
+
+OPERATIONS = ("pixelate", "quantize", "transparent")
+MAX_BODY_SIZE = 64 * 1024 * 1024
+SOURCE_CACHE_SIZE = 8
+
+# decoded sources of the current worker process, keyed by content hash
+_sources = OrderedDict()
+
+
+def _decode_source(digest, data):
+    """
+    Worker: return the decoded image for the content hash, decoding it only once.
+    """
+    if digest in _sources:
+        _sources.move_to_end(digest)
+        return _sources[digest]
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    _sources[digest] = image
+    if len(_sources) > SOURCE_CACHE_SIZE:
+        _sources.popitem(last=False)
+    return image
+
+
+def render(operation, digest, data, params):
+    """
+    Worker: run one operation and return the encoded PNG.
+    """
+    image = _decode_source(digest, data)
+    pixel_size = params.get("pixel_size", 6)
+    num_colors = params.get("num_colors", 4)
+    if operation == "quantize":
+        result = pixelation.quantize(image, num_colors)
+    else:
+        grid = pixelation.pixelate(image, pixel_size, num_colors,
+                                   kernel=params.get("kernel", "nearest"))
+        result = pixelation.upscale(grid, pixel_size)
+        if operation == "transparent":
+            color = params.get("color")
+            if color is None:
+                # like the editor, remove the brightest color of the palette
+                if grid.mode != "P":
+                    grid = grid.convert("RGB").quantize(256)
+                color = max(pixelation.palette_colors(grid, num_colors or 256), key=sum)
+            result = pixelation.make_transparent(
+                result, color, params.get("tolerance", 20))
+    output = io.BytesIO()
+    result.save(output, "PNG")
+    return output.getvalue()
+
+
+def parse_params(query):
+    """
+    Parse the query string into operation parameters.
+    """
+    params = {}
+    for key, value in parse_qsl(query):
+        if key in ("pixel_size", "num_colors", "tolerance"):
+            params[key] = int(value)
+        elif key == "color":
+            value = value.lstrip("#")
+            params[key] = tuple(int(value[i:i + 2], 16) for i in (0, 2, 4))
+        elif key == "kernel":
+            if value not in pixelation.KERNELS:
+                raise ValueError(f"Unknown kernel: {value}")
+            params[key] = value
+        else:
+            raise ValueError(f"Unknown parameter: {key}")
+    if params.get("pixel_size", 1) < 1:
+        raise ValueError("pixel_size must be positive")
+    return params
+
+
+class ResultCache:
+    """
+    An LRU of encoded results, bounded by the total size in bytes.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.items = OrderedDict()
+
+    def get(self, key):
+        """
+        Return the cached result or None.
+        """
+        if key not in self.items:
+            return None
+        self.items.move_to_end(key)
+        return self.items[key]
+
+    def put(self, key, value):
+        """
+        Store a result, evicting the least recently used ones.
+        """
+        if key in self.items:
+            self.size -= len(self.items.pop(key))
+        self.items[key] = value
+        self.size += len(value)
+        while self.size > self.max_bytes and self.items:
+            _, evicted = self.items.popitem(last=False)
+            self.size -= len(evicted)
+
+
+class Metrics:
+    """
+    Request counters and recent latencies.
+    """
+
+    def __init__(self, window=1000):
+        self.started = time.monotonic()
+        self.requests = 0
+        self.errors = 0
+        self.cache_hits = 0
+        self.coalesced = 0
+        self.computed = 0
+        self.in_flight = 0
+        self.latencies = deque(maxlen=window)
+
+    def report(self, cache):
+        """
+        Return the metrics as a dictionary.
+        """
+        latencies = sorted(self.latencies)
+
+        def percentile(fraction):
+            if not latencies:
+                return 0.0
+            return round(latencies[min(len(latencies) - 1,
+                                       int(fraction * len(latencies)))] * 1000, 2)
+
+        uptime = time.monotonic() - self.started
+        return {
+            "uptime_s": round(uptime, 1),
+            "requests": self.requests,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "throughput_rps": round(self.requests / uptime, 2) if uptime else 0.0,
+            "latency_ms": {"p50": percentile(0.5), "p95": percentile(0.95),
+                           "p99": percentile(0.99)},
+            "cache": {"hits": self.cache_hits, "coalesced": self.coalesced,
+                      "computed": self.computed, "entries": len(cache.items),
+                      "bytes": cache.size},
+        }
+
+
+class PixelServer:
+    """
+    Class to represent the pixelation HTTP service.
+    """
+
+    def __init__(self, host="127.0.0.1", port=8765, workers=None,
+                 cache_bytes=256 * 1024 * 1024):
+        self.host = host
+        self.port = port
+        # workers are started on demand; forking them would hand the open client
+        # sockets to the children and keep those connections from closing
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        self.cache = ResultCache(cache_bytes)
+        self.metrics = Metrics()
+        self.pending = {}
+
+    async def process(self, operation, data, params):
+        """
+        Return the PNG for a request, from the cache, from an identical request
+        already being computed, or by computing it on the process pool.
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        key = (operation, digest, tuple(sorted(params.items())))
+        result = self.cache.get(key)
+        if result is not None:
+            self.metrics.cache_hits += 1
+            return result
+        if key in self.pending:
+            self.metrics.coalesced += 1
+            return await asyncio.shield(self.pending[key])
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(
+            self.executor, render, operation, digest, data, params)
+        self.pending[key] = future
+        try:
+            result = await asyncio.shield(future)
+        finally:
+            del self.pending[key]
+        self.metrics.computed += 1
+        self.cache.put(key, result)
+        return result
+
+    async def handle(self, reader, writer):
+        """
+        Serve a single HTTP request on the connection.
+        """
+        start = time.perf_counter()
+        self.metrics.in_flight += 1
+        status, content_type, body = 500, "text/plain", b"Internal error"
+        try:
+            request_line = (await reader.readline()).decode("latin-1").split()
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            if len(request_line) < 2:
+                raise ValueError("Malformed request")
+            method, target = request_line[0], urlsplit(request_line[1])
+            path = target.path.strip("/")
+            length = int(headers.get("content-length", 0))
+            if length > MAX_BODY_SIZE:
+                status, body = 413, b"Image too large"
+            elif method == "GET" and path == "metrics":
+                status, content_type = 200, "application/json"
+                body = json.dumps(self.metrics.report(self.cache)).encode()
+            elif method == "GET" and path == "health":
+                status, body = 200, b"ok"
+            elif method == "POST" and path in OPERATIONS:
+                data = await reader.readexactly(length)
+                if not data:
+                    raise ValueError("The request body must contain an image")
+                result = await self.process(path, data, parse_params(target.query))
+                status, content_type, body = 200, "image/png", result
+            else:
+                status, body = 404, b"Not found"
+        except (ValueError, UnidentifiedImageError, asyncio.IncompleteReadError) as error:
+            status, body = 400, str(error).encode()
+        except Exception as error:  # keep serving after unexpected worker errors
+            body = str(error).encode()
+        finally:
+            self.metrics.in_flight -= 1
+        if status >= 400:
+            self.metrics.errors += 1
+        writer.write(
+            f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+            f"Content-Type: {content_type}\r\nContent-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n".encode() + body)
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+        self.metrics.requests += 1
+        self.metrics.latencies.append(time.perf_counter() - start)
+
+    async def serve(self):
+        """
+        Run the service until it is cancelled.
+        """
+        server = await asyncio.start_server(self.handle, self.host, self.port)
+        print(f"Serving on http://{self.host}:{self.port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.executor.shutdown(cancel_futures=True)
+
+
+def main(argv=None):
+    """
+    The command line entry point.
+    """
+    parser = argparse.ArgumentParser(description="Run the local pixelation service.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("-w", "--workers", type=int)
+    parser.add_argument("--cache-mb", type=int, default=256,
+                        help="The size of the result cache in megabytes")
+    args = parser.parse_args(argv)
+    server = PixelServer(args.host, args.port, args.workers,
+                         args.cache_mb * 1024 * 1024)
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        print("Stopped")
+
+
+if __name__ == "__main__":
+    main()
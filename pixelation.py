@@ -0,0 +1,363 @@
+"""
+This module contains the image processing core of the pixel editor:
+shrinking an image to its logical pixel grid, reducing its colors and
+scaling it back up. It has no GUI dependencies, so the batch tools can use
+the same pipeline as the PixelEditor class.
+"""
+
+import numpy as np
+from PIL import Image
+
+
+# bump when a change makes the pipeline produce different grids, so cached
+# results of the previous version are not used any more
+PIPELINE_VERSION = 2
+KERNELS = ("nearest", "box", "median", "mode")
+# how many source pixels the median and mode kernels process at a time
+BLOCK_CHUNK_PIXELS = 1 << 20
+# the scales a JPEG can be decoded at directly (1/8, 1/4, 1/2)
+LOAD_SCALES = (8, 4, 2)
+# a block keeps at least this many source pixels across after a reduced load
+MIN_BLOCK_PIXELS = 2
+# other formats are decoded in full anyway: reducing them only pays off for
+# the kernels that process every pixel, on large images
+REDUCE_KERNELS = ("median", "mode")
+REDUCE_MIN_PIXELS = 8 * 1000 * 1000
+
+
+def load_scale(image, pixel_size, kernel="nearest"):
+    """
+    Return how much an opened, not yet decoded, image can be shrunk while
+    loading it for the grid of pixel_size, and how: "draft" (JPEG decoding
+    at a lower resolution), "reduce" (decoding in full, then averaging) or
+    "full" (no shrinking).
+    """
+    width, height = image.size
+    if width < pixel_size or height < pixel_size:
+        return 1, "full"
+    for scale in LOAD_SCALES:
+        if pixel_size % scale == 0 and pixel_size // scale >= MIN_BLOCK_PIXELS:
+            break
+    else:
+        return 1, "full"
+    if image.format == "JPEG":
+        return scale, "draft"
+    if kernel in REDUCE_KERNELS and width * height >= REDUCE_MIN_PIXELS:
+        return scale, "reduce"
+    return 1, "full"
+
+
+def load(image, pixel_size, kernel="nearest"):
+    """
+    Decode an opened image at the lowest resolution the grid of pixel_size
+    still needs. The grid has the same number of cells as with a full decode.
+
+    :return: The decoded image, the pixel size of a block in it, and the
+        load path taken: "full", "draft 1/N" or "reduce 1/N".
+    """
+    scale, method = load_scale(image, pixel_size, kernel)
+    cols, rows = image.size[0] // pixel_size, image.size[1] // pixel_size
+    if method == "draft":
+        width, height = image.size
+        image.draft(image.mode, (width // scale, height // scale))
+        # the decoder may settle for a smaller scale, which also divides pixel_size
+        scale = next((candidate for candidate in LOAD_SCALES
+                      if image.size[0] == -(-width // candidate)), 1)
+        image.load()
+    elif method == "reduce":
+        image.load()
+        if image.mode not in ("L", "RGB", "RGBA"):
+            has_alpha = image.mode in ("LA", "PA") or "transparency" in image.info
+            image = image.convert("RGBA" if has_alpha else "RGB")
+        image = image.reduce(scale)
+    else:
+        image.load()
+        return image, pixel_size, "full"
+    if scale == 1:
+        return image, pixel_size, "full"
+    block = pixel_size // scale
+    # a reduced image rounds its size up, which must not add a partial cell
+    image = image.crop((0, 0, cols * block, rows * block))
+    return image, block, f"{method} 1/{scale}"
+
+
+def downscale(image, pixel_size, kernel="nearest"):
+    """
+    Shrink the image so that every block of pixel_size x pixel_size pixels
+    becomes a single pixel of the logical grid.
+
+    :param image: The image to shrink.
+    :param pixel_size: The size of a block.
+    :param kernel: How a block becomes a pixel: "nearest" takes the pixel at
+        the center of the block, "box" averages the block, "median" takes the
+        per-channel median and "mode" the most frequent color of the block.
+    """
+    if kernel not in KERNELS:
+        raise ValueError(f"Unknown kernel: {kernel}")
+    cols = max(1, image.size[0] // pixel_size)
+    rows = max(1, image.size[1] // pixel_size)
+    if image.size[0] < pixel_size or image.size[1] < pixel_size:
+        # smaller than a single block
+        return image.resize((cols, rows), Image.NEAREST)
+    if image.size != (cols * pixel_size, rows * pixel_size):
+        # drop the partial blocks at the right and bottom edges, so every
+        # kernel works on whole blocks
+        image = image.crop((0, 0, cols * pixel_size, rows * pixel_size))
+    if kernel == "nearest":
+        return image.resize((cols, rows), Image.NEAREST)
+    if image.mode not in ("L", "RGB", "RGBA"):
+        has_alpha = image.mode in ("LA", "PA") or "transparency" in image.info
+        image = image.convert("RGBA" if has_alpha else "RGB")
+    if kernel == "box":
+        return image.reduce(pixel_size)
+    pixels = np.asarray(image)
+    if pixels.ndim == 2:
+        pixels = pixels[..., np.newaxis]
+    block_function = _block_median if kernel == "median" else _block_mode
+    cells = np.empty((rows, cols, pixels.shape[2]), dtype=np.uint8)
+    # a strip of block rows at a time keeps the temporary arrays small
+    step = max(1, BLOCK_CHUNK_PIXELS // (cols * pixel_size * pixel_size))
+    for top in range(0, rows, step):
+        bottom = min(rows, top + step)
+        cells[top:bottom] = block_function(_blocks(
+            pixels[top * pixel_size:bottom * pixel_size], pixel_size))
+    return Image.fromarray(cells[..., 0] if image.mode == "L" else cells, image.mode)
+
+
+def _blocks(pixels, pixel_size):
+    """
+    Reshape (rows * pixel_size, cols * pixel_size, channels) pixels into
+    (rows, cols, pixel_size * pixel_size, channels) blocks.
+    """
+    height, width, channels = pixels.shape
+    rows, cols = height // pixel_size, width // pixel_size
+    return pixels.reshape(rows, pixel_size, cols, pixel_size, channels) \
+        .transpose(0, 2, 1, 3, 4).reshape(rows, cols, -1, channels)
+
+
+def _block_median(blocks):
+    """
+    Return the per-channel median of every block.
+    """
+    count = blocks.shape[2]
+    low, high = (count - 1) // 2, count // 2
+    # partial sorting of the uint8 values is much cheaper than np.median
+    middle = np.partition(blocks, (low, high), axis=2)
+    return ((middle[:, :, low].astype(np.uint16) + middle[:, :, high] + 1) // 2) \
+        .astype(np.uint8)
+
+
+def _block_mode(blocks):
+    """
+    Return the most frequent color of every block.
+    """
+    channels = blocks.shape[-1]
+    # pack the channels of a pixel into one number, so colors compare at once
+    codes = np.zeros(blocks.shape[:3], dtype=np.uint32)
+    for channel in range(channels):
+        codes |= blocks[..., channel].astype(np.uint32) << (8 * channel)
+    codes.sort(axis=-1)
+    count = codes.shape[-1]
+    positions = np.arange(count, dtype=np.int32)
+    # after sorting, equal colors form runs: find the longest run of every block
+    starts = np.ones(codes.shape, dtype=bool)
+    starts[..., 1:] = codes[..., 1:] != codes[..., :-1]
+    ends = np.ones(codes.shape, dtype=bool)
+    ends[..., :-1] = starts[..., 1:]
+    run_start = np.maximum.accumulate(np.where(starts, positions, 0), axis=-1)
+    run_end = np.minimum.accumulate(
+        np.where(ends, positions, count - 1)[..., ::-1], axis=-1)[..., ::-1]
+    longest = (run_end - run_start).argmax(axis=-1)
+    best = np.take_along_axis(codes, longest[..., np.newaxis], axis=-1)[..., 0]
+    return np.stack([(best >> (8 * channel)) & 255 for channel in range(channels)],
+                    axis=-1).astype(np.uint8)
+
+
+def upscale(image, pixel_size):
+    """
+    Scale a logical grid back up so that every cell is pixel_size pixels wide.
+    """
+    return image.resize(
+        (image.size[0] * pixel_size, image.size[1] * pixel_size), Image.NEAREST
+    )
+
+
+def quantize(image, num_colors=None, palette=None, dither=Image.FLOYDSTEINBERG):
+    """
+    Reduce the colors of the image.
+
+    :param image: The image to quantize.
+    :param num_colors: The number of colors of an adaptive palette.
+    :param palette: A "P" mode image whose palette is used instead of an adaptive one.
+    :param dither: The dithering method.
+    :return: A "P" mode image, or the image itself if there is nothing to do.
+    """
+    if palette is not None:
+        return image.convert("RGB").quantize(palette=palette, dither=dither)
+    if num_colors:
+        return image.convert(
+            "P", palette=Image.ADAPTIVE, colors=num_colors, dither=dither)
+    return image
+
+
+def pixelate(image, pixel_size, num_colors=None, palette=None, kernel="nearest"):
+    """
+    Return the logical grid of the pixelated image: one pixel per cell.
+    """
+    return quantize(downscale(image, pixel_size, kernel), num_colors, palette)
+
+
+def pixelate_file(path, pixel_size, num_colors=None, palette=None, kernel="nearest"):
+    """
+    Return the logical grid of an image file, decoded only at the resolution
+    the grid needs. The load path taken is in the "load" info of the grid.
+    """
+    with Image.open(path) as image:
+        image, block, load_path = load(image, pixel_size, kernel)
+        grid = pixelate(image, block, num_colors, palette, kernel)
+    grid.info["load"] = load_path
+    return grid
+
+
+def sample_pixels(image, max_samples=4096, rng=None):
+    """
+    Pick up to max_samples random RGB pixels of the image.
+
+    :return: An array of shape (n, 3) and dtype uint8.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    pixels = np.asarray(image.convert("RGB")).reshape(-1, 3)
+    if len(pixels) <= max_samples:
+        return pixels.copy()
+    return pixels[rng.choice(len(pixels), max_samples, replace=False)]
+
+
+class PixelReservoir:
+    """
+    A fixed size uniform sample of the pixels of many images.
+    The memory used does not depend on the number of images added.
+    """
+
+    def __init__(self, size=65536, rng=None):
+        self.size = size
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.samples = np.empty((size, 3), dtype=np.uint8)
+        self.seen = 0
+
+    def add(self, pixels):
+        """
+        Add an (n, 3) array of pixels to the sample (reservoir sampling).
+        """
+        free = max(0, min(self.size - self.seen, len(pixels)))
+        self.samples[self.seen:self.seen + free] = pixels[:free]
+        rest = pixels[free:]
+        if len(rest):
+            positions = np.arange(self.seen + free, self.seen + len(pixels))
+            slots = self.rng.integers(0, positions + 1)
+            keep = slots < self.size
+            self.samples[slots[keep]] = rest[keep]
+        self.seen += len(pixels)
+
+    def pixels(self):
+        """
+        Return the sampled pixels.
+        """
+        return self.samples[:min(self.seen, self.size)]
+
+
+def fit_palette(samples, num_colors):
+    """
+    Fit an adaptive palette to an (n, 3) array of RGB samples.
+
+    :return: A "P" mode image that can be passed as the palette argument of quantize.
+    """
+    if not len(samples):
+        raise ValueError("No pixels to fit a palette to")
+    sample_image = Image.fromarray(
+        np.ascontiguousarray(samples).reshape(1, -1, 3), "RGB")
+    return sample_image.quantize(num_colors)
+
+
+def palette_colors(image, num_colors=256):
+    """
+    Return the palette of a "P" mode image as a list of RGB tuples.
+    """
+    palette = image.getpalette()[: num_colors * 3]
+    return [tuple(palette[i: i + 3]) for i in range(0, len(palette), 3)]
+
+
+def make_transparent(image, color, tolerance=20):
+    """
+    Return an RGBA copy of the image where every pixel close to color is transparent.
+
+    :param image: The image.
+    :param color: The RGB color to remove.
+    :param tolerance: How far (per channel) a pixel may be from color to be removed.
+    """
+    pixels = np.array(image.convert("RGBA"))
+    distance = np.abs(pixels[..., :3].astype(np.int16) - np.array(color[:3]))
+    pixels[(distance < tolerance).all(axis=-1)] = (255, 255, 255, 0)
+    return Image.fromarray(pixels, "RGBA")
+
+
+def _run_end(match, filled, row, col, step):
+    """
+    Return the first column from col in direction step (1 or -1) that is not
+    free to fill, or the column past the edge of the grid. The row is looked
+    at in windows that grow from col, so the work is proportional to the
+    length of the run, not to the width of the grid.
+    """
+    cols = match.shape[1]
+    size = 256
+    while True:
+        if step > 0:
+            end = min(cols, col + size)
+            window = match[row, col:end] & ~filled[row, col:end]
+        else:
+            end = max(-1, col - size)
+            window = (match[row, end + 1:col + 1] & ~filled[row, end + 1:col + 1])[::-1]
+        blocked = int(np.argmin(window))
+        if not window[blocked]:
+            return col + step * blocked
+        if end in (-1, cols):
+            return end
+        col = end
+        size *= 8
+
+
+def flood_fill(match, row, col, connectivity=4):
+    """
+    Return the region of a grid that a bucket fill started at (row, col) covers.
+
+    The fill runs scanline by scanline: every step fills a whole horizontal
+    run of matching cells and queues one seed per run in the rows above and
+    below, so the work is proportional to the number of cells filled.
+
+    :param match: A 2D boolean array of the cells that may be filled.
+    :param row: The row of the seed cell.
+    :param col: The column of the seed cell.
+    :param connectivity: 4 to fill through edges only, 8 to also fill through corners.
+    :return: A 2D boolean array of the filled cells.
+    """
+    rows, cols = match.shape
+    filled = np.zeros_like(match, dtype=bool)
+    if not match[row, col]:
+        return filled
+    reach = 1 if connectivity == 8 else 0
+    seeds = [(row, col)]
+    while seeds:
+        row, col = seeds.pop()
+        if filled[row, col]:
+            continue
+        # extend the run to the left and right of the seed
+        left = _run_end(match, filled, row, col, -1) + 1
+        right = _run_end(match, filled, row, col, 1)
+        filled[row, left:right] = True
+        low, high = max(0, left - reach), min(cols, right + reach)
+        for next_row in (row - 1, row + 1):
+            if 0 <= next_row < rows:
+                free = match[next_row, low:high] & ~filled[next_row, low:high]
+                # one seed at the start of every run of free cells
+                starts = np.flatnonzero(free & ~np.concatenate(([False], free[:-1])))
+                seeds.extend((next_row, low + start) for start in starts)
+    return filled
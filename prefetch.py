@@ -0,0 +1,178 @@
+"""
+This module contains the Prefetcher class, which computes the logical grids
+of the states next to the current one (one pixel size or one color count
+away) in the background, so that the next step of the slider or the D-pad is
+served from memory instead of pixelating the source again.
+"""
+
+import os
+import threading
+from collections import OrderedDict, deque
+import disk_cache
+
+MAX_PIXEL_SIZE = 50
+MAX_NUM_COLORS = 256
+
+
+def grid_size(image):
+    """
+    Return the number of bytes a logical grid takes in memory.
+    """
+    return image.width * image.height * len(image.getbands()) \
+        + (768 if image.mode == "P" else 0)
+
+
+class Prefetcher:
+    """
+    Class to represent the cache of pixelated states and its background worker.
+
+    A state is keyed by (image path, pixel size, number of colors, kernel) and
+    holds the logical grid returned by pixelation.pixelate.
+    """
+
+    def __init__(self, depth=1, max_bytes=64 * 1024 * 1024):
+        """
+        :param depth: How many steps away from the current state are prefetched,
+            0 disables prefetching but keeps the cache.
+        :param max_bytes: The memory cap of the cached grids.
+        """
+        self.depth = depth
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.grids = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.prefetched = 0
+        self.cancelled = 0
+        self._jobs = deque()
+        self._running = None
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._closed = False
+        self._thread = None
+
+    def get(self, key):
+        """
+        Return the cached grid of the state, or None, and count the hit or miss.
+        A state the worker is computing right now is waited for.
+        """
+        with self._lock:
+            while key == self._running:
+                self._wake.wait()
+            grid = self.grids.get(key)
+            if grid is None:
+                self.misses += 1
+                return None
+            self.grids.move_to_end(key)
+            self.hits += 1
+            return grid
+
+    def put(self, key, grid):
+        """
+        Cache the grid of a state, evicting the least recently used ones.
+        """
+        with self._lock:
+            self._store(key, grid)
+
+    def _store(self, key, grid):
+        if key in self.grids:
+            self.size -= grid_size(self.grids.pop(key))
+        size = grid_size(grid)
+        if size > self.max_bytes:
+            return
+        self.grids[key] = grid
+        self.size += size
+        while self.size > self.max_bytes:
+            _, evicted = self.grids.popitem(last=False)
+            self.size -= grid_size(evicted)
+
+    def neighbours(self, key):
+        """
+        Return the states up to depth steps away from key, nearest first.
+        """
+        image_path, pixel_size, num_colors, kernel = key
+        states = []
+        for step in range(1, self.depth + 1):
+            for delta in (step, -step):
+                if 1 <= pixel_size + delta <= MAX_PIXEL_SIZE:
+                    states.append((image_path, pixel_size + delta, num_colors, kernel))
+                if num_colors and 1 <= num_colors + delta <= MAX_NUM_COLORS:
+                    states.append((image_path, pixel_size, num_colors + delta, kernel))
+        return states
+
+    def prefetch(self, key):
+        """
+        Queue the neighbours of the state the user is at. Queued states that
+        are not next to it any more (the user jumped elsewhere) are cancelled.
+        """
+        if self.depth < 1:
+            return
+        with self._lock:
+            wanted = [state for state in self.neighbours(key)
+                      if state not in self.grids and state != self._running]
+            self.cancelled += sum(1 for state in self._jobs if state not in wanted)
+            self._jobs = deque(wanted)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._work, name="prefetch", daemon=True)
+                self._thread.start()
+            self._wake.notify_all()
+
+    def _work(self):
+        """
+        The background worker: compute queued states one at a time.
+        """
+        try:
+            # a niced thread only gets the CPU time the GUI does not need
+            # (per thread on Linux, not available everywhere)
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 10)
+        except (AttributeError, OSError):
+            pass
+        while True:
+            with self._lock:
+                while not self._jobs and not self._closed:
+                    self._wake.wait()
+                if self._closed:
+                    return
+                key = self._running = self._jobs.popleft()
+            try:
+                grid = self._compute(key)
+            except Exception:  # a failed prefetch is computed again, and reported, on demand
+                grid = None
+            with self._lock:
+                self._running = None
+                if grid is not None:
+                    self._store(key, grid)
+                    self.prefetched += 1
+                self._wake.notify_all()
+
+    def _compute(self, key):
+        image_path, pixel_size, num_colors, kernel = key
+        return disk_cache.pixelate_file(image_path, pixel_size, num_colors,
+                                        kernel=kernel)
+
+    def stats(self):
+        """
+        Return the cache statistics as a dictionary.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "prefetched": self.prefetched,
+                "cancelled": self.cancelled,
+                "queued": len(self._jobs),
+                "entries": len(self.grids),
+                "bytes": self.size,
+            }
+
+    def close(self):
+        """
+        Stop the background worker.
+        """
+        with self._lock:
+            self._closed = True
+            self._jobs.clear()
+            self._wake.notify_all()
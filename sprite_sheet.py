@@ -0,0 +1,178 @@
+"""
+This module pixelates many images (the frames of an animation or the tiles of
+a sprite set) against one shared palette and packs them into a sprite sheet
+with a JSON atlas.
+
+The palette is fitted to a fixed size random sample of the pixels of all the
+images, so memory stays flat however many images are processed. The images
+are then pixelated in parallel against that palette.
+
+Usage:
+    python3 sprite_sheet.py frames/ -o sheet.png --pixel-size 6 --num-colors 8
+"""
+
+import argparse
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from PIL import Image
+import pixelation
+import disk_cache
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".gif", ".webp")
+
+
+def collect_images(inputs):
+    """
+    Expand the given files and folders into a sorted list of image paths.
+    """
+    paths = []
+    for path in inputs:
+        if os.path.isdir(path):
+            paths.extend(
+                os.path.join(path, name) for name in sorted(os.listdir(path))
+                if name.lower().endswith(IMAGE_EXTENSIONS))
+        else:
+            paths.append(path)
+    if not paths:
+        raise FileNotFoundError("No images found")
+    return paths
+
+
+def fit_shared_palette(paths, pixel_size, num_colors, samples_per_image=4096,
+                       sample_size=65536, seed=0):
+    """
+    Fit one palette over a sampled union of the pixels of all the images.
+
+    Every image is opened, shrunk to its logical grid and sampled, one at a
+    time; only the fixed size sample is kept in memory.
+
+    :return: A "P" mode image holding the shared palette.
+    """
+    rng = np.random.default_rng(seed)
+    reservoir = pixelation.PixelReservoir(sample_size, rng)
+    for path in paths:
+        with Image.open(path) as image:
+            grid = pixelation.downscale(image, pixel_size)
+        reservoir.add(pixelation.sample_pixels(grid, samples_per_image, rng))
+    return pixelation.fit_palette(reservoir.pixels(), num_colors)
+
+
+def _pixelate_with_palette(task):
+    """
+    Worker: pixelate one image against the shared palette.
+    """
+    path, pixel_size, palette = task
+    palette_image = Image.new("P", (1, 1))
+    palette_image.putpalette(palette)
+    return disk_cache.pixelate_file(path, pixel_size, palette=palette_image)
+
+
+def pack(sizes, columns=None):
+    """
+    Place rectangles row by row on a sheet.
+
+    :param sizes: A list of (width, height) tuples.
+    :param columns: The number of rectangles per row, by default about a square sheet.
+    :return: The list of (x, y) positions and the (width, height) of the sheet.
+    """
+    columns = columns or math.ceil(math.sqrt(len(sizes)))
+    positions = []
+    sheet_width = 0
+    top = 0
+    for row_start in range(0, len(sizes), columns):
+        row = sizes[row_start:row_start + columns]
+        left = 0
+        for width, _ in row:
+            positions.append((left, top))
+            left += width
+        sheet_width = max(sheet_width, left)
+        top += max(height for _, height in row)
+    return positions, (sheet_width, top)
+
+
+def make_sprite_sheet(inputs, output="sheet.png", pixel_size=6, num_colors=4,
+                      scale=None, columns=None, workers=None,
+                      samples_per_image=4096):
+    """
+    Pixelate the images against a shared palette and pack them into a sprite sheet.
+
+    :param inputs: Image files and/or folders of frames.
+    :param output: The path of the sprite sheet; the atlas is saved next to it as JSON.
+    :param pixel_size: The pixel size used for every image.
+    :param num_colors: The number of colors of the shared palette.
+    :param scale: How many sheet pixels a cell takes, by default pixel_size.
+    :param columns: The number of sprites per row.
+    :param workers: The number of worker processes.
+    :param samples_per_image: How many pixels of each image are used to fit the palette.
+    :return: The atlas dictionary.
+    """
+    paths = collect_images(inputs)
+    scale = scale or pixel_size
+    palette_image = fit_shared_palette(
+        paths, pixel_size, num_colors, samples_per_image)
+    palette = palette_image.getpalette()
+    tasks = [(path, pixel_size, palette) for path in paths]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        grids = list(executor.map(_pixelate_with_palette, tasks))
+
+    sizes = [(grid.width * scale, grid.height * scale) for grid in grids]
+    positions, sheet_size = pack(sizes, columns)
+    # every sprite shares the palette, so the indices can be pasted as they are
+    sheet = Image.new("P", sheet_size)
+    sheet.putpalette(palette)
+    frames = {}
+    for path, grid, (x, y), (width, height) in zip(paths, grids, positions, sizes):
+        sheet.paste(pixelation.upscale(grid, scale), (x, y))
+        name = os.path.splitext(os.path.basename(path))[0]
+        if name in frames:
+            name = f"{name}_{len(frames)}"
+        frames[name] = {
+            "frame": {"x": x, "y": y, "w": width, "h": height},
+            "source": path,
+        }
+    sheet.save(output)
+
+    atlas = {
+        "frames": frames,
+        "meta": {
+            "image": os.path.basename(output),
+            "size": {"w": sheet_size[0], "h": sheet_size[1]},
+            "pixel_size": pixel_size,
+            "scale": scale,
+            "palette": [list(color) for color in
+                        pixelation.palette_colors(palette_image, num_colors)],
+        },
+    }
+    with open(os.path.splitext(output)[0] + ".json", "w", encoding="utf-8") as file:
+        json.dump(atlas, file, indent=2)
+    return atlas
+
+
+def main(argv=None):
+    """
+    The command line entry point.
+    """
+    parser = argparse.ArgumentParser(
+        description="Pixelate images with a shared palette into a sprite sheet.")
+    parser.add_argument("inputs", nargs="+", help="Image files or folders of frames")
+    parser.add_argument("-o", "--output", default="sheet.png")
+    parser.add_argument("-p", "--pixel-size", type=int, default=6)
+    parser.add_argument("-n", "--num-colors", type=int, default=4)
+    parser.add_argument("-s", "--scale", type=int,
+                        help="Sheet pixels per cell (default: the pixel size)")
+    parser.add_argument("-c", "--columns", type=int)
+    parser.add_argument("-w", "--workers", type=int)
+    parser.add_argument("--samples", type=int, default=4096,
+                        help="Pixels sampled from each image to fit the palette")
+    args = parser.parse_args(argv)
+    atlas = make_sprite_sheet(args.inputs, args.output, args.pixel_size,
+                              args.num_colors, args.scale, args.columns,
+                              args.workers, args.samples)
+    print(f"Saved {len(atlas['frames'])} sprites to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
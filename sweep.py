@@ -0,0 +1,269 @@
+"""
+This module renders a contact sheet of one image pixelated with every
+combination of a range of pixel sizes and color counts, to compare them side
+by side before choosing one.
+
+The source is decoded once into shared memory, and a pool of worker processes
+pixelates it from there, so no worker decodes or receives a copy of the
+image. The pixel sizes the pipeline loads at a reduced resolution (see
+pixelation.load) are decoded that way by the workers instead. Results are
+yielded as soon as each one is ready, and stored in the pixelation cache, so
+choosing a cell in the editor does not compute it again.
+
+Usage:
+    python3 sweep.py images/Bruce.png
+    python3 sweep.py images/Bruce.png --pixel-sizes 4 8 12 16 24 --num-colors 2 4 8 16 32 -o sheet.png
+"""
+
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+import numpy as np
+from PIL import Image, ImageDraw
+import pixelation
+import disk_cache
+
+DEFAULT_PIXEL_SIZES = (4, 6, 8, 12, 16, 24)
+DEFAULT_NUM_COLORS = (2, 4, 8, 16, 32)
+THUMBNAIL_SIZE = 160
+LABEL_HEIGHT = 16
+
+# the shared sources a worker process has attached, by shared memory name
+_attached = {}
+
+
+class SharedSource:
+    """
+    Class to represent a decoded source image in shared memory.
+    """
+
+    def __init__(self, path):
+        with Image.open(path) as image:
+            # the same modes pixelation.downscale works in
+            if image.mode not in ("L", "RGB", "RGBA"):
+                cacheable = False
+                image = image.convert("RGBA" if "A" in image.getbands()
+                                      or "transparency" in image.info else "RGB")
+            else:
+                # a pixelation of the decoded pixels equals one of the file,
+                # unless the file carries a transparent color
+                cacheable = "transparency" not in image.info
+            array = np.asarray(image)
+        self.path = path
+        self.mode = image.mode
+        self.shape = array.shape
+        self.cacheable = cacheable
+        self.memory = shared_memory.SharedMemory(create=True, size=array.nbytes)
+        np.ndarray(self.shape, np.uint8, buffer=self.memory.buf)[...] = array
+
+    @property
+    def handle(self):
+        """
+        What a worker needs to attach the source.
+        """
+        return self.memory.name, self.shape, self.mode
+
+    def close(self):
+        self.memory.close()
+        self.memory.unlink()
+
+
+def _source_image(handle):
+    """
+    Return the shared source as an image, attaching it once per worker.
+    """
+    name, shape, mode = handle
+    if name not in _attached:
+        # a source from an earlier sweep is gone, let go of it
+        for memory, _ in _attached.values():
+            memory.close()
+        _attached.clear()
+        # spawned workers share the resource tracker of the sweep, which
+        # unlinks the memory once, when the sweep ends
+        memory = shared_memory.SharedMemory(name=name)
+        array = np.ndarray(shape, np.uint8, buffer=memory.buf)
+        _attached[name] = (memory, Image.fromarray(array, mode))
+    return _attached[name][1]
+
+
+def _pack(grid):
+    """
+    Return a grid as plain data for the parent process. A pickled image
+    loses the alpha of its palette, so the palette is sent in its own mode.
+    """
+    palette_mode = grid.palette.mode if grid.mode == "P" else None
+    palette = grid.getpalette(palette_mode) if palette_mode else None
+    return grid.mode, grid.size, grid.tobytes(), palette_mode, palette, grid.info
+
+
+def _unpack(data):
+    """
+    Return the grid packed by _pack.
+    """
+    mode, size, pixels, palette_mode, palette, info = data
+    grid = Image.frombytes(mode, size, pixels)
+    if palette is not None:
+        grid.putpalette(palette, palette_mode)
+    grid.info.update(info)
+    return grid
+
+
+def _render(handle, pixel_size, num_colors, kernel):
+    """
+    Pixelate the shared source, in a worker process.
+    """
+    grid = pixelation.pixelate(_source_image(handle), pixel_size, num_colors,
+                               kernel=kernel)
+    # the shared source is a full decode, see pixelation.load
+    grid.info["load"] = "full"
+    return _pack(grid)
+
+
+def _render_file(path, pixel_size, num_colors, kernel):
+    """
+    Pixelate the image file as the pipeline does, in a worker process.
+    """
+    return _pack(pixelation.pixelate_file(path, pixel_size, num_colors, kernel=kernel))
+
+
+def sweep(path, pixel_sizes=DEFAULT_PIXEL_SIZES, num_colors=DEFAULT_NUM_COLORS,
+          kernel="nearest", workers=None, cancelled=None):
+    """
+    Pixelate an image file with every pixel size and color count.
+
+    :param path: The image file.
+    :param pixel_sizes: The pixel sizes to try.
+    :param num_colors: The color counts to try.
+    :param kernel: The downsampling kernel, see pixelation.KERNELS.
+    :param workers: The number of worker processes, by default one per CPU.
+    :param cancelled: A callable that returns True to stop the sweep early.
+    :return: A generator of (pixel size, number of colors, grid), in the
+        order the grids are ready.
+    """
+    cache = disk_cache.default_cache()
+    digest = cache.file_digest(path) if cache is not None else None
+    pending = []
+    for pixel_size in pixel_sizes:
+        for colors in num_colors:
+            grid = None
+            if cache is not None:
+                grid = cache.get(digest, cache.params(pixel_size, colors, kernel=kernel))
+            if grid is not None:
+                yield pixel_size, colors, grid
+            else:
+                pending.append((pixel_size, colors))
+    if not pending:
+        return
+    with Image.open(path) as image:
+        # the cells the pipeline computes from a reduced load are computed
+        # the same way, straight from the file, the others share the full decode
+        reduced = {pixel_size for pixel_size, _ in pending
+                   if pixelation.load_scale(image, pixel_size, kernel)[1] != "full"}
+    source = SharedSource(path) if len(reduced) < len(pending) else None
+    # spawned, not forked: the sweep may run from a thread of the Qt application
+    executor = ProcessPoolExecutor(
+        max_workers=min(workers or os.cpu_count() or 1, len(pending)),
+        mp_context=multiprocessing.get_context("spawn"))
+    try:
+        # the most expensive cells (small pixel sizes) go first
+        futures = {}
+        for pixel_size, colors in sorted(pending):
+            if pixel_size in reduced:
+                future = executor.submit(_render_file, path, pixel_size, colors, kernel)
+            else:
+                future = executor.submit(_render, source.handle, pixel_size,
+                                         colors, kernel)
+            futures[future] = (pixel_size, colors)
+        for future in as_completed(futures):
+            if cancelled is not None and cancelled():
+                break
+            pixel_size, colors = futures[future]
+            grid = _unpack(future.result())
+            if cache is not None and (pixel_size in reduced or source.cacheable):
+                cache.put(digest, cache.params(pixel_size, colors, kernel=kernel), grid)
+            yield pixel_size, colors, grid
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        if source is not None:
+            source.close()
+
+
+def thumbnail(grid, size=THUMBNAIL_SIZE):
+    """
+    Return the grid scaled with square cells to fit a size x size square.
+    """
+    scale = size / max(grid.size)
+    width = max(1, round(grid.width * scale))
+    height = max(1, round(grid.height * scale))
+    return grid.convert("RGBA").resize((width, height), Image.NEAREST)
+
+
+class ContactSheet:
+    """
+    Class to represent the contact sheet image, one row per pixel size and
+    one column per color count, filled in as the cells are ready.
+    """
+
+    def __init__(self, pixel_sizes, num_colors, size=THUMBNAIL_SIZE):
+        self.pixel_sizes = list(pixel_sizes)
+        self.num_colors = list(num_colors)
+        self.size = size
+        self.image = Image.new("RGB", (len(self.num_colors) * size,
+                                       len(self.pixel_sizes) * (size + LABEL_HEIGHT)),
+                               (34, 34, 34))
+        self.draw = ImageDraw.Draw(self.image)
+
+    def origin(self, pixel_size, num_colors):
+        """
+        Return the top left corner of a cell.
+        """
+        return (self.num_colors.index(num_colors) * self.size,
+                self.pixel_sizes.index(pixel_size) * (self.size + LABEL_HEIGHT))
+
+    def add(self, pixel_size, num_colors, grid):
+        left, top = self.origin(pixel_size, num_colors)
+        image = thumbnail(grid, self.size)
+        self.image.paste(image, (left + (self.size - image.width) // 2,
+                                 top + (self.size - image.height) // 2), image)
+        self.draw.text((left + 4, top + self.size + 2),
+                       f"{pixel_size}px {num_colors} colors", fill=(255, 255, 255))
+
+
+def main(argv=None):
+    """
+    The command line entry point.
+    """
+    parser = argparse.ArgumentParser(
+        description="Render a contact sheet of pixel sizes and color counts.")
+    parser.add_argument("image")
+    parser.add_argument("-o", "--output", default="sweep.png")
+    parser.add_argument("-p", "--pixel-sizes", type=int, nargs="+",
+                        default=list(DEFAULT_PIXEL_SIZES))
+    parser.add_argument("-c", "--num-colors", type=int, nargs="+",
+                        default=list(DEFAULT_NUM_COLORS))
+    parser.add_argument("-k", "--kernel", choices=pixelation.KERNELS, default="nearest")
+    parser.add_argument("-w", "--workers", type=int, default=None)
+    parser.add_argument("--size", type=int, default=THUMBNAIL_SIZE,
+                        help="The size of a thumbnail in pixels")
+    args = parser.parse_args(argv)
+
+    sheet = ContactSheet(args.pixel_sizes, args.num_colors, args.size)
+    total = len(sheet.pixel_sizes) * len(sheet.num_colors)
+    start = time.perf_counter()
+    for done, (pixel_size, num_colors, grid) in enumerate(sweep(
+            args.image, args.pixel_sizes, args.num_colors, args.kernel, args.workers), 1):
+        sheet.add(pixel_size, num_colors, grid)
+        print(f"[{done}/{total}] {pixel_size}px {num_colors} colors "
+              f"at {time.perf_counter() - start:.2f} s")
+    sheet.image.save(args.output)
+    print(f"Saved {args.output}")
+    cache = disk_cache.default_cache()
+    if cache is not None:
+        print(f"Cache: {cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
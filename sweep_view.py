@@ -0,0 +1,161 @@
+"""
+This module contains the SweepWindow class, the contact sheet of the editor:
+the current image pixelated with a range of pixel sizes and color counts,
+filled in as the worker processes finish each cell. Clicking a cell applies
+its settings to the editor, from the pixelation cache the sweep filled.
+"""
+
+from PyQt5.QtCore import Qt, QSize, QThread, pyqtSignal
+from PyQt5.QtGui import QImage, QPixmap, QIcon
+from PyQt5.QtWidgets import QWidget, QGridLayout, QHBoxLayout, QVBoxLayout, \
+    QLabel, QLineEdit, QPushButton, QToolButton, QScrollArea, QApplication
+import sweep
+
+
+def parse_values(text):
+    """
+    Return the sorted integers of a text like "4 6 8" or "4-24:4" (a range
+    with a step).
+    """
+    values = set()
+    for part in text.replace(",", " ").split():
+        if "-" in part:
+            bounds, _, step = part.partition(":")
+            first, last = bounds.split("-")
+            values.update(range(int(first), int(last) + 1, int(step or 1)))
+        else:
+            values.add(int(part))
+    return sorted(value for value in values if value > 0)
+
+
+class SweepWorker(QThread):
+    """
+    Class to represent a thread running one sweep.
+    """
+    # pixel size, number of colors, grid
+    cell_ready = pyqtSignal(int, int, object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, image_path, pixel_sizes, num_colors, kernel, parent=None):
+        super().__init__(parent)
+        self.image_path = image_path
+        self.pixel_sizes = pixel_sizes
+        self.num_colors = num_colors
+        self.kernel = kernel
+        self._cancelled = False
+
+    def cancel(self):
+        """
+        Stop the sweep after the cells being computed.
+        """
+        self._cancelled = True
+
+    def run(self):
+        try:
+            for pixel_size, num_colors, grid in sweep.sweep(
+                    self.image_path, self.pixel_sizes, self.num_colors, self.kernel,
+                    cancelled=lambda: self._cancelled):
+                self.cell_ready.emit(pixel_size, num_colors, grid)
+        except (OSError, ValueError) as error:
+            self.failed.emit(str(error))
+
+
+class SweepWindow(QWidget):
+    """
+    Class to represent the contact sheet window.
+    """
+    # pixel size, number of colors
+    chosen = pyqtSignal(int, int)
+
+    def __init__(self, image_editor, parent=None):
+        super().__init__(parent, Qt.Window)
+        self.image_editor = image_editor
+        self.worker = None
+        self.cells = {}
+        self.setWindowTitle("Pixel size and colors")
+        self.pixel_sizes_edit = QLineEdit(
+            " ".join(map(str, sweep.DEFAULT_PIXEL_SIZES)), self)
+        self.pixel_sizes_edit.setToolTip('Pixel sizes, like "4 6 8" or "4-24:4"')
+        self.num_colors_edit = QLineEdit(
+            " ".join(map(str, sweep.DEFAULT_NUM_COLORS)), self)
+        self.num_colors_edit.setToolTip('Color counts, like "2 4 8" or "2-32:2"')
+        self.run_button = QPushButton("Run", self)
+        self.run_button.clicked.connect(self.run)
+        self.status_label = QLabel(self)
+        controls = QHBoxLayout()
+        controls.addWidget(QLabel("Pixel sizes", self))
+        controls.addWidget(self.pixel_sizes_edit)
+        controls.addWidget(QLabel("Colors", self))
+        controls.addWidget(self.num_colors_edit)
+        controls.addWidget(self.run_button)
+        self.grid = QGridLayout()
+        sheet = QWidget(self)
+        sheet.setLayout(self.grid)
+        scroll_area = QScrollArea(self)
+        scroll_area.setWidget(sheet)
+        scroll_area.setWidgetResizable(True)
+        layout = QVBoxLayout(self)
+        layout.addLayout(controls)
+        layout.addWidget(scroll_area)
+        layout.addWidget(self.status_label)
+        self.resize(6 * (sweep.THUMBNAIL_SIZE + 12), 3 * (sweep.THUMBNAIL_SIZE + 40))
+        # the worker processes must not outlive the application
+        QApplication.instance().aboutToQuit.connect(self.stop)
+
+    def run(self):
+        """
+        Lay out an empty cell per combination and start the sweep.
+        """
+        self.stop()
+        try:
+            pixel_sizes = parse_values(self.pixel_sizes_edit.text())
+            num_colors = parse_values(self.num_colors_edit.text())
+        except ValueError:
+            self.status_label.setText("Invalid pixel sizes or colors")
+            return
+        for button in self.cells.values():
+            self.grid.removeWidget(button)
+            button.deleteLater()
+        self.cells = {}
+        for row, pixel_size in enumerate(pixel_sizes):
+            for column, colors in enumerate(num_colors):
+                button = QToolButton(self)
+                button.setToolButtonStyle(Qt.ToolButtonTextUnderIcon)
+                button.setIconSize(QSize(sweep.THUMBNAIL_SIZE, sweep.THUMBNAIL_SIZE))
+                button.setText(f"{pixel_size}px {colors} colors")
+                button.setEnabled(False)
+                button.clicked.connect(
+                    lambda _, size=pixel_size, count=colors: self.chosen.emit(size, count))
+                self.grid.addWidget(button, row, column)
+                self.cells[(pixel_size, colors)] = button
+        self.status_label.setText(f"0/{len(self.cells)}")
+        self.worker = SweepWorker(self.image_editor.image_path, pixel_sizes,
+                                  num_colors, self.image_editor.kernel, self)
+        self.worker.cell_ready.connect(self._on_cell_ready)
+        self.worker.failed.connect(self.status_label.setText)
+        self.worker.start()
+
+    def _on_cell_ready(self, pixel_size, num_colors, grid):
+        thumbnail = sweep.thumbnail(grid)
+        data = thumbnail.tobytes("raw", "RGBA")
+        qimage = QImage(data, thumbnail.width, thumbnail.height,
+                        4 * thumbnail.width, QImage.Format_RGBA8888)
+        button = self.cells[(pixel_size, num_colors)]
+        # the QImage only borrows the bytes, the pixmap copies them
+        button.setIcon(QIcon(QPixmap.fromImage(qimage)))
+        button.setEnabled(True)
+        done = sum(cell.isEnabled() for cell in self.cells.values())
+        self.status_label.setText(f"{done}/{len(self.cells)}")
+
+    def stop(self):
+        """
+        Cancel a running sweep and wait for its worker processes.
+        """
+        if self.worker is not None:
+            self.worker.cancel()
+            self.worker.wait()
+            self.worker = None
+
+    def closeEvent(self, event):
+        self.stop()
+        super().closeEvent(event)
@@ -0,0 +1,247 @@
+"""
+This module contains the ThumbnailIndex class, a persistent index of the
+images of a folder: a small thumbnail and the metadata (dimensions,
+modification time, content hash) of every image, so a folder of thousands of
+images can be browsed, and previewed pixelated, without decoding the images.
+
+A refresh only indexes the files that are new or changed since the last one
+(by modification time and size), on a pool of threads, and yields them as
+they are ready. The index of a folder lives in ~/.cache/pixel-art-index
+unless the PIXEL_ART_INDEX environment variable names another folder.
+
+Usage:
+    python3 thumbnail_index.py sprites/
+"""
+
+import argparse
+import io
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from PIL import Image, UnidentifiedImageError
+from disk_cache import hash_bytes
+from export import atomic_output
+from sprite_sheet import IMAGE_EXTENSIONS
+
+DEFAULT_DIRECTORY = os.path.join(os.path.expanduser("~"), ".cache", "pixel-art-index")
+THUMBNAIL_SIZE = 128
+INDEX_VERSION = 1
+# entries indexed between two saves of the index, so an interrupted scan keeps its work
+SAVE_EVERY = 200
+
+
+class ThumbnailIndex:
+    """
+    Class to represent the thumbnail index of one folder.
+
+    An entry is keyed by file name and holds its size (width, height), mtime_ns,
+    bytes, hash and format, or only an error for a file that is not a
+    readable image. Thumbnails are stored by content hash, so copies of an
+    image share one.
+    """
+
+    def __init__(self, folder, directory=None):
+        self.folder = os.path.abspath(folder)
+        if directory is None:
+            directory = os.environ.get("PIXEL_ART_INDEX", DEFAULT_DIRECTORY)
+        # one index per folder, named after its path
+        self.directory = os.path.join(directory, hash_bytes(self.folder.encode())[:16])
+        self.thumbnail_directory = os.path.join(self.directory, "thumbnails")
+        self.index_path = os.path.join(self.directory, "index.json")
+        self.entries = {}
+        self.indexed = 0
+        self.failed = 0
+        self.dropped = 0
+        os.makedirs(self.thumbnail_directory, exist_ok=True)
+        self.load()
+
+    def load(self):
+        """
+        Read the saved index. A missing, unreadable or outdated index is empty.
+        """
+        try:
+            with open(self.index_path, encoding="utf-8") as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return
+        if data.get("version") == INDEX_VERSION and data.get("folder") == self.folder:
+            self.entries = data["entries"]
+
+    def save(self):
+        """
+        Write the index. The file is replaced only once it is complete.
+        """
+        with atomic_output(self.index_path) as temporary:
+            with open(temporary, "w", encoding="utf-8") as file:
+                json.dump({"version": INDEX_VERSION, "folder": self.folder,
+                           "entries": self.entries}, file)
+
+    def path(self, name):
+        return os.path.join(self.folder, name)
+
+    def thumbnail_path(self, entry):
+        return os.path.join(self.thumbnail_directory, entry["hash"] + ".png")
+
+    def stale(self):
+        """
+        Return the names of the images that are new or changed since they
+        were indexed, and drop the entries of the deleted ones.
+
+        :return: A list of (name, os.stat_result).
+        """
+        stale, found = [], set()
+        with os.scandir(self.folder) as listing:
+            for item in listing:
+                if not item.name.lower().endswith(IMAGE_EXTENSIONS) or not item.is_file():
+                    continue
+                found.add(item.name)
+                status = item.stat()
+                entry = self.entries.get(item.name)
+                if entry is None or entry["mtime_ns"] != status.st_mtime_ns \
+                        or entry["bytes"] != status.st_size:
+                    stale.append((item.name, status))
+        for name in set(self.entries) - found:
+            del self.entries[name]
+            self.dropped += 1
+        return sorted(stale)
+
+    def prune(self):
+        """
+        Delete the thumbnails no entry uses any more.
+        """
+        used = {entry["hash"] + ".png" for entry in self.entries.values()
+                if "hash" in entry}
+        for name in os.listdir(self.thumbnail_directory):
+            if name.endswith(".png") and name not in used:
+                os.remove(os.path.join(self.thumbnail_directory, name))
+
+    def _index(self, name, status):
+        """
+        Read one image, store its thumbnail and return its entry.
+        """
+        with open(self.path(name), "rb") as file:
+            data = file.read()
+        entry = {"mtime_ns": status.st_mtime_ns, "bytes": status.st_size,
+                 "hash": hash_bytes(data)}
+        with Image.open(io.BytesIO(data)) as image:
+            entry["size"] = list(image.size)
+            entry["format"] = image.format
+            thumbnail_path = self.thumbnail_path(entry)
+            if not os.path.exists(thumbnail_path):
+                # JPEGs are decoded at the smallest scale the thumbnail allows
+                image.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE), Image.BICUBIC)
+                has_alpha = "A" in image.getbands() or "transparency" in image.info
+                image = image.convert("RGBA" if has_alpha else "RGB")
+                with atomic_output(thumbnail_path) as temporary:
+                    image.save(temporary, "PNG")
+        return entry
+
+    def refresh(self, workers=None, cancelled=None):
+        """
+        Index the new and changed images of the folder.
+
+        :param workers: The number of threads, by default one per CPU.
+        :param cancelled: A callable that returns True to stop early. The
+            images indexed so far are kept.
+        :return: A generator of the (name, entry) of every image indexed, in
+            the order they are ready.
+        """
+        stale = self.stale()
+        if self.dropped:
+            self.prune()
+        if not stale:
+            self.save()
+            return
+        # thumbnails of the changed images that may no longer be used
+        replaced = False
+        # decoding and hashing release the GIL, so threads run them in parallel
+        executor = ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1)
+        try:
+            futures = {executor.submit(self._index, name, status): (name, status)
+                       for name, status in stale}
+            for done, future in enumerate(as_completed(futures), 1):
+                if cancelled is not None and cancelled():
+                    break
+                name, status = futures[future]
+                old_hash = self.entries.get(name, {}).get("hash")
+                try:
+                    entry = future.result()
+                except (OSError, UnidentifiedImageError, ValueError) as error:
+                    if isinstance(error, UnidentifiedImageError):
+                        error = "not a readable image"
+                    print(f"Could not index {name}: {error}")
+                    self.failed += 1
+                    # not read again until the file changes
+                    self.entries[name] = {"mtime_ns": status.st_mtime_ns,
+                                          "bytes": status.st_size, "error": str(error)}
+                    replaced = replaced or old_hash is not None
+                    continue
+                self.entries[name] = entry
+                replaced = replaced or old_hash not in (None, entry["hash"])
+                self.indexed += 1
+                if done % SAVE_EVERY == 0:
+                    self.save()
+                yield name, entry
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            self.save()
+            if replaced:
+                self.prune()
+
+    def images(self):
+        """
+        Return the sorted names of the indexed images that could be read.
+        """
+        return sorted(name for name, entry in self.entries.items() if "error" not in entry)
+
+    def thumbnail(self, name):
+        """
+        Return the thumbnail of an indexed image.
+        """
+        with Image.open(self.thumbnail_path(self.entries[name])) as image:
+            image.load()
+        return image
+
+    def preview(self, name, pixel_size, num_colors=None):
+        """
+        Return a preview of the logical grid of an indexed image, made from
+        its thumbnail: the same number of cells (up to the thumbnail size)
+        and of colors, without decoding the image.
+        """
+        entry = self.entries[name]
+        thumbnail = self.thumbnail(name)
+        cols = max(1, entry["size"][0] // pixel_size)
+        rows = max(1, entry["size"][1] // pixel_size)
+        if cols < thumbnail.width:
+            thumbnail = thumbnail.resize((cols, rows), Image.NEAREST)
+        if not num_colors:
+            return thumbnail
+        # a fast octree palette: close enough for a preview, and about 40
+        # times faster than the median cut of the editor on photos
+        return thumbnail.quantize(num_colors, method=Image.FASTOCTREE,
+                                  dither=Image.FLOYDSTEINBERG)
+
+    def stats(self):
+        return {"entries": len(self.entries), "indexed": self.indexed,
+                "failed": self.failed, "dropped": self.dropped}
+
+
+def main(argv=None):
+    """
+    The command line entry point.
+    """
+    parser = argparse.ArgumentParser(description="Index the images of a folder.")
+    parser.add_argument("folder")
+    parser.add_argument("-w", "--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+    start = time.perf_counter()
+    index = ThumbnailIndex(args.folder)
+    for _ in index.refresh(args.workers):
+        pass
+    print(f"{args.folder}: {index.stats()} in {time.perf_counter() - start:.2f} s")
+    print(f"Index: {index.directory}")
+
+
+if __name__ == "__main__":
+    main()
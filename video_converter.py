@@ -0,0 +1,259 @@
+"""
+This module converts clips into pixel art, frame by frame.
+
+Frames are read one at a time from an animated GIF/APNG (or any multi-frame
+image Pillow can open) or from a folder of images, pixelated on a pool of
+worker processes and written to the output as soon as they are ready, in
+their original order. At most queue_size frames are in flight at any time,
+so memory does not grow with the length of the clip.
+
+The palette is fitted on the first frame and reused for the following ones,
+which avoids flicker and saves the quantizer most of its work. It is only
+fitted again when a frame looks different enough from the frame the palette
+was fitted on (a scene change).
+
+Usage:
+    python3 video_converter.py clip.gif -o pixel_clip.gif --pixel-size 6 --num-colors 8
+"""
+
+import argparse
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from PIL import Image, ImageSequence, GifImagePlugin
+import pixelation
+from sprite_sheet import collect_images
+
+DEFAULT_DURATION = 100
+
+
+def read_frames(source):
+    """
+    Yield (frame, duration) pairs one at a time.
+
+    :param source: A multi-frame image file, or a folder of frame images.
+    """
+    if os.path.isdir(source):
+        for path in collect_images([source]):
+            with Image.open(path) as frame:
+                yield frame.convert("RGB"), DEFAULT_DURATION
+        return
+    with Image.open(source) as clip:
+        for frame in ImageSequence.Iterator(clip):
+            yield frame.convert("RGB"), frame.info.get("duration", DEFAULT_DURATION)
+
+
+def color_histogram(image, bits=3):
+    """
+    Return the normalized histogram of the image over a coarse RGB grid.
+    """
+    pixels = np.asarray(image).reshape(-1, 3) >> (8 - bits)
+    bins = (pixels[:, 0].astype(np.int32) << (2 * bits)) \
+        | (pixels[:, 1].astype(np.int32) << bits) | pixels[:, 2]
+    histogram = np.bincount(bins, minlength=1 << (3 * bits))
+    return histogram / max(1, len(bins))
+
+
+def histogram_distance(first, second):
+    """
+    Return how different two normalized histograms are, between 0 and 1.
+    """
+    return float(np.abs(first - second).sum()) / 2
+
+
+def fit_frame(frame, size):
+    """
+    Return a "P" mode frame cropped to size, or padded to it by repeating its
+    last row and column.
+    """
+    if frame.size == size:
+        return frame
+    width, height = size
+    cells = np.asarray(frame)[:height, :width]
+    cells = np.pad(cells, ((0, height - cells.shape[0]), (0, width - cells.shape[1])),
+                   mode="edge")
+    fitted = Image.fromarray(cells, "P")
+    fitted.putpalette(frame.getpalette())
+    if "transparency" in frame.info:
+        fitted.info["transparency"] = frame.info["transparency"]
+    return fitted
+
+
+class GifStreamWriter:
+    """
+    Write an animated GIF one frame at a time. Every frame carries its own
+    color table, so the palette can change on scene changes.
+    """
+
+    def __init__(self, file_name, loop=0, size=None):
+        """
+        :param size: The (width, height) of the GIF, by default the size of
+            the first frame. Every frame is cropped or padded to it, since the
+            size is written before the frames are known.
+        """
+        self.file_name = file_name
+        self.loop = loop
+        self.size = size
+        self.file = None
+        self.frames = 0
+        self.bytes_written = 0
+
+    def write(self, frame, duration):
+        """
+        Append a "P" mode frame to the GIF.
+        """
+        if self.size is None:
+            self.size = frame.size
+        frame = fit_frame(frame, self.size)
+        if self.file is None:
+            self.file = open(self.file_name, "wb")
+            header, _ = GifImagePlugin.getheader(
+                frame, info={"loop": self.loop, "duration": duration})
+            self.file.write(b"".join(header))
+        for data in GifImagePlugin.getdata(
+                frame, duration=duration, include_color_table=True):
+            self.file.write(data)
+        self.frames += 1
+        self.bytes_written = self.file.tell()
+
+    def close(self):
+        """
+        Write the GIF trailer and close the file.
+        """
+        if self.file is not None:
+            self.file.write(b";")
+            self.bytes_written = self.file.tell()
+            self.file.close()
+            self.file = None
+
+
+class FrameFolderWriter:
+    """
+    Write every frame as a numbered PNG file in a folder.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.frames = 0
+        os.makedirs(folder, exist_ok=True)
+
+    def write(self, frame, duration):
+        """
+        Save the next frame.
+        """
+        frame.save(os.path.join(self.folder, f"frame_{self.frames:05d}.png"))
+        self.frames += 1
+
+    def close(self):
+        """
+        Nothing to finish: every frame is already on disk.
+        """
+
+
+def _pixelate_frame(task):
+    """
+    Worker: quantize one logical grid against the palette and scale it up.
+    """
+    grid, palette, scale = task
+    palette_image = Image.new("P", (1, 1))
+    palette_image.putpalette(palette)
+    return pixelation.upscale(pixelation.quantize(grid, palette=palette_image), scale)
+
+
+class VideoConverter:
+    """
+    Class to convert a clip into pixel art with a temporally stable palette.
+    """
+
+    def __init__(self, pixel_size=6, num_colors=4, scale=None,
+                 scene_threshold=0.35, queue_size=8, workers=None):
+        """
+        :param pixel_size: The pixel size used for every frame.
+        :param num_colors: The number of colors of the palette.
+        :param scale: How many output pixels a cell takes, by default pixel_size.
+        :param scene_threshold: How different (0 to 1) a frame must be from the
+            frame the palette was fitted on to fit a new palette.
+        :param queue_size: The maximum number of frames in flight.
+        :param workers: The number of worker processes.
+        """
+        self.pixel_size = pixel_size
+        self.num_colors = num_colors
+        self.scale = scale or pixel_size
+        self.scene_threshold = scene_threshold
+        self.queue_size = queue_size
+        self.workers = workers
+        self.palette = None
+        self.palette_histogram = None
+        self.palette_fits = 0
+
+    def palette_for(self, grid):
+        """
+        Return the palette for the next frame, fitting a new one on a scene change.
+        """
+        histogram = color_histogram(grid)
+        if self.palette is None or histogram_distance(
+                histogram, self.palette_histogram) > self.scene_threshold:
+            palette_image = pixelation.fit_palette(
+                pixelation.sample_pixels(grid), self.num_colors)
+            self.palette = palette_image.getpalette()
+            self.palette_histogram = histogram
+            self.palette_fits += 1
+        return self.palette
+
+    def convert(self, source, output):
+        """
+        Convert a clip and write it to output: a .gif file, or a folder of PNG frames.
+
+        :return: The number of frames written.
+        """
+        if output.lower().endswith(".gif"):
+            writer = GifStreamWriter(output)
+        else:
+            writer = FrameFolderWriter(output)
+        pending = deque()
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                for frame, duration in read_frames(source):
+                    grid = pixelation.downscale(frame, self.pixel_size)
+                    task = (grid, self.palette_for(grid), self.scale)
+                    pending.append((executor.submit(_pixelate_frame, task), duration))
+                    # wait for the oldest frame so that only queue_size are in flight
+                    if len(pending) >= self.queue_size:
+                        future, frame_duration = pending.popleft()
+                        writer.write(future.result(), frame_duration)
+                while pending:
+                    future, frame_duration = pending.popleft()
+                    writer.write(future.result(), frame_duration)
+        finally:
+            for future, _ in pending:
+                future.cancel()
+            writer.close()
+        print(f"Converted {writer.frames} frames with {self.palette_fits} palette(s)")
+        return writer.frames
+
+
+def main(argv=None):
+    """
+    The command line entry point.
+    """
+    parser = argparse.ArgumentParser(
+        description="Convert a GIF/APNG or a folder of frames into pixel art.")
+    parser.add_argument("source", help="A multi-frame image or a folder of frames")
+    parser.add_argument("-o", "--output", default="pixel_clip.gif",
+                        help="A .gif file or a folder for PNG frames")
+    parser.add_argument("-p", "--pixel-size", type=int, default=6)
+    parser.add_argument("-n", "--num-colors", type=int, default=4)
+    parser.add_argument("-s", "--scale", type=int,
+                        help="Output pixels per cell (default: the pixel size)")
+    parser.add_argument("-t", "--scene-threshold", type=float, default=0.35)
+    parser.add_argument("-q", "--queue-size", type=int, default=8)
+    parser.add_argument("-w", "--workers", type=int)
+    args = parser.parse_args(argv)
+    converter = VideoConverter(args.pixel_size, args.num_colors, args.scale,
+                               args.scene_threshold, args.queue_size, args.workers)
+    converter.convert(args.source, args.output)
+
+
+if __name__ == "__main__":
+    main()